@@ -1,19 +1,49 @@
 from django.contrib import admin
-from .models import Product, Bill, BillItem, ShopDenomination, BalanceDenomination, UserProfile
+from django.db.models import Q
+from .models import Product, Bill, BillItem, ShopDenomination, BalanceDenomination, UserProfile, InvoiceEmail, CustomerSummary
+from .catalogue import prefix_q, search_products
+from .checkout import normalise_email
+from .pagination import EstimatedCountPaginator
+from .stock import with_counters
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists over tables that grow with every bill: no COUNT(*) of the whole table per page"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone', 'city', 'state']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email', 'phone']
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ['product_id', 'name', 'available_stocks', 'price', 'tax_percentage']
+class ProductAdmin(LargeTableAdmin):
+    list_display = ['product_id', 'name', 'stock', 'stock_shards', 'price', 'tax_percentage']
     list_filter = ['tax_percentage']
+    # Searched by prefix in get_search_results; also serves autocomplete_fields
     search_fields = ['product_id', 'name']
-    ordering = ['name']
+    # Matches the (name, id) index, so pages are read in index order
+    ordering = ['name', 'id']
+    # Moving stock between the product and its counters is left to `manage.py shard_stock`
+    readonly_fields = ['stock_shards']
+
+    def get_queryset(self, request):
+        return with_counters(super().get_queryset(request))
+
+    @admin.display(description='Stock')
+    def stock(self, obj):
+        return obj.on_hand
+
+    def get_search_results(self, request, queryset, search_term):
+        """Product ID prefix, or name prefix in any case"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return search_products(queryset, term), False
 
 
 @admin.register(ShopDenomination)
@@ -32,6 +62,12 @@ class BillItemInline(admin.TabularInline):
     readonly_fields = ['product', 'quantity', 'unit_price', 'tax_percentage', 'tax_amount', 'total_price']
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 class BalanceDenominationInline(admin.TabularInline):
     model = BalanceDenomination
@@ -39,21 +75,87 @@ class BalanceDenominationInline(admin.TabularInline):
     readonly_fields = ['value', 'count']
     can_delete = False
 
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Bill)
-class BillAdmin(admin.ModelAdmin):
+class BillAdmin(LargeTableAdmin):
     list_display = ['id', 'customer_email', 'rounded_net_price', 'amount_paid', 'balance', 'created_at']
-    list_filter = ['created_at']
+    # Drill-down by year, month and day, each a range on the (-created_at, -id) index
+    date_hierarchy = 'created_at'
     search_fields = ['customer_email']
     readonly_fields = [
         'customer_email', 'total_price_without_tax', 'total_tax', 
-        'net_price', 'rounded_net_price', 'amount_paid', 'balance', 'created_at'
+        'net_price', 'rounded_net_price', 'amount_paid', 'balance', 'idempotency_key', 'created_at'
     ]
     inlines = [BillItemInline, BalanceDenominationInline]
     ordering = ['-created_at']
 
+    def get_search_results(self, request, queryset, search_term):
+        """Customer email prefix, or a bill number"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        match = prefix_q('customer_email', normalise_email(term))
+        if term.isdigit():
+            match |= Q(pk=int(term))
+        return queryset.filter(match), False
+
     def has_add_permission(self, request):
         return False
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(BillItem)
+class BillItemAdmin(LargeTableAdmin):
+    """Read-only list of bill lines, for looking up a product's sales"""
+    list_display = ['id', 'bill', 'product', 'quantity', 'unit_price', 'tax_percentage', 'total_price']
+    list_select_related = ['bill', 'product']
+    search_fields = ['product__product_id']
+    ordering = ['-id']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Product ID prefix, through the (product, bill) index"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(prefix_q('product__product_id', term)), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InvoiceEmail)
+class InvoiceEmailAdmin(LargeTableAdmin):
+    list_display = ['id', 'bill', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_select_related = ['bill']
+    list_filter = ['status']
+    search_fields = ['recipient']
+    readonly_fields = [
+        'bill', 'recipient', 'subject', 'body', 'attempts', 'last_error', 'created_at', 'sent_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CustomerSummary)
+class CustomerSummaryAdmin(admin.ModelAdmin):
+    list_display = ['customer_email', 'bill_count', 'total_spent', 'total_tax', 'last_purchase_at']
+    search_fields = ['customer_email']
+    readonly_fields = [
+        'customer_email', 'bill_count', 'total_spent', 'total_tax',
+        'last_purchase_at', 'product_quantities', 'updated_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,123 @@
+"""
+Archival of old bills.
+
+Bills older than settings.BILL_ARCHIVE_AFTER_DAYS are moved, by the
+archive_bills command, from billing_bill and its item, change, invoice and
+outbox tables into one ArchivedBill row each: the columns lookups need plus
+the bill's snapshot, zlib-compressed. The live tables and their indexes then
+only grow with recent trade.
+
+Each batch is archived in its own short transaction, oldest bills first, so
+checkouts are never held up for long. The bill page (via invoices.py) and
+customer_purchases read archived bills transparently, and idempotency keys
+are looked up in both tables (bills_by_key); CustomerSummary and
+DailySalesRollup keep their totals, and rebuilding either accounts for the
+archive. Archived snapshots are kept as written: a new SNAPSHOT_VERSION must
+still render the versions already in the archive.
+"""
+import json
+import zlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from .models import ArchivedBill, Bill, InvoiceEmail
+from .snapshots import SNAPSHOT_VERSION, rebuild_snapshots, snapshot_key
+
+
+def archive_after_days():
+    return getattr(settings, 'BILL_ARCHIVE_AFTER_DAYS', 730)
+
+
+def pack_snapshot(snapshot):
+    return zlib.compress(json.dumps(snapshot, separators=(',', ':')).encode())
+
+
+def unpack_snapshot(data):
+    return json.loads(zlib.decompress(data))
+
+
+def is_current(snapshot):
+    return bool(snapshot) and snapshot.get('version') == SNAPSHOT_VERSION
+
+
+def bill_receipts(bills):
+    """
+    The data invoices are rendered from (see invoices.receipt_for), for a
+    mix of Bill and ArchivedBill rows, in the same order. Live bills without
+    a current snapshot get one written on the way, all in one go.
+    """
+    stale = [bill.id for bill in bills if not isinstance(bill, ArchivedBill) and not is_current(bill.snapshot)]
+    rebuilt = rebuild_snapshots(stale)
+    receipts = []
+    for bill in bills:
+        if isinstance(bill, ArchivedBill):
+            snapshot = unpack_snapshot(bill.document)
+        else:
+            snapshot = rebuilt.get(bill.id, bill.snapshot)
+        receipts.append(
+            {'id': bill.id, 'customer_email': bill.customer_email, 'created_at': bill.created_at, **snapshot}
+        )
+    return receipts
+
+
+def bills_by_key(keys):
+    """
+    IDs of the bills, live or archived, created with any of the given
+    idempotency keys, by key. One query; a key is in at most one table.
+    """
+    keys = list(keys)
+    live = Bill.objects.filter(idempotency_key__in=keys).order_by().values_list('idempotency_key', 'id')
+    archived = ArchivedBill.objects.filter(idempotency_key__in=keys).order_by().values_list('idempotency_key', 'id')
+    return dict(live.union(archived, all=True))
+
+
+def archived_receipt(bill_id):
+    """The receipt of an archived bill, or None if it is not in the archive"""
+    bill = ArchivedBill.objects.filter(pk=bill_id).first()
+    return bill_receipts([bill])[0] if bill is not None else None
+
+
+def archive_bills(before, batch_size=500):
+    """
+    Move bills created before `before` into the archive, `batch_size` per
+    transaction, oldest first. Bills with an invoice email still pending
+    stay live until it is delivered or fails. Yields (bills_archived,
+    created_at of the newest) after each batch.
+    """
+    while True:
+        archived, newest = _archive_batch(before, batch_size)
+        if not archived:
+            return
+        yield archived, newest
+
+
+def archivable_bills(before):
+    """Bills archive_bills would move, oldest first"""
+    pending = InvoiceEmail.objects.filter(bill=OuterRef('pk'), status=InvoiceEmail.STATUS_PENDING)
+    return Bill.objects.filter(created_at__lt=before).exclude(Exists(pending)).order_by('created_at', 'id')
+
+
+@transaction.atomic
+def _archive_batch(before, batch_size):
+    rows = list(
+        archivable_bills(before).values(
+            'id', 'customer_email', 'rounded_net_price', 'total_tax', 'idempotency_key', 'created_at', 'snapshot'
+        )[:batch_size]
+    )
+    if not rows:
+        return 0, None
+
+    rebuilt = rebuild_snapshots([row['id'] for row in rows if not is_current(row['snapshot'])])
+    archived = []
+    for row in rows:
+        snapshot = rebuilt.get(row['id'], row.pop('snapshot'))
+        archived.append(ArchivedBill(document=pack_snapshot(snapshot), **row))
+    ArchivedBill.objects.bulk_create(archived)
+
+    bill_ids = [row['id'] for row in rows]
+    # Items, change, invoice documents and outbox rows go with their bills
+    Bill.objects.filter(pk__in=bill_ids).delete()
+    # A cached snapshot would have the bill page store a document for a bill that is gone
+    transaction.on_commit(lambda: cache.delete_many([snapshot_key(bill_id) for bill_id in bill_ids]))
+    return len(rows), rows[-1]['created_at']
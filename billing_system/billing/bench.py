@@ -0,0 +1,197 @@
+"""
+Helpers shared by the `bench_*` management commands.
+Benchmarks seed their own data inside a transaction that is always rolled
+back, so they can be run against any database without leaving rows behind.
+Concurrency benchmarks need rows other connections can see; they use
+committed_data, which deletes what the run created on exit.
+"""
+import json
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.test.utils import override_settings
+
+from django.utils import timezone
+
+from .models import (
+    Product, ShopDenomination, Bill, BillItem, BalanceDenomination, CustomerSummary, DailySalesRollup
+)
+
+DENOMINATION_VALUES = [500, 50, 20, 10, 5, 2, 1]
+
+
+@contextmanager
+def scratch_data():
+    """
+    Run the block in a transaction that is rolled back on exit, with mail and
+    cache swapped for private in-memory backends so nothing leaks out.
+    """
+    with override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+    ):
+        with transaction.atomic():
+            try:
+                yield
+            finally:
+                transaction.set_rollback(True)
+
+
+def seed_products(count, stock=1_000_000, prefix='BENCH'):
+    """Create `count` products with plenty of stock and return their product IDs"""
+    Product.objects.bulk_create([
+        Product(
+            product_id=f'{prefix}{i:06d}',
+            name=f'Bench product {i}',
+            available_stocks=stock,
+            price=Decimal('10.50') + i % 100,
+            tax_percentage=Decimal(['5.00', '12.00', '18.00'][i % 3]),
+        )
+        for i in range(count)
+    ])
+    return [f'{prefix}{i:06d}' for i in range(count)]
+
+
+def seed_denominations(count=100_000):
+    """Make sure every denomination exists with a large float of notes"""
+    for value in DENOMINATION_VALUES:
+        ShopDenomination.objects.update_or_create(value=value, defaults={'count': count})
+
+
+@contextmanager
+def committed_data(prefix, emails):
+    """
+    Run the block in autocommit mode with mail and cache swapped for private
+    in-memory backends. On exit, delete bills for `emails`, their summaries,
+    and products whose ID starts with `prefix` along with their rollups, and
+    put the shop's denominations back to their counts before the block.
+    """
+    denominations = list(ShopDenomination.objects.all())
+    with override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+    ):
+        try:
+            yield
+        finally:
+            ShopDenomination.objects.exclude(id__in=[denom.id for denom in denominations]).delete()
+            ShopDenomination.objects.bulk_update(denominations, ['count'])
+            Bill.objects.filter(customer_email__in=emails).delete()
+            CustomerSummary.objects.filter(customer_email__in=emails).delete()
+            DailySalesRollup.objects.filter(product__product_id__startswith=prefix).delete()
+            Product.objects.filter(product_id__startswith=prefix).delete()
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep the created_at values we set instead of auto_now_add"""
+    field = model._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_bills(count, emails=('bench@example.com',), batch_size=5000):
+    """
+    Create `count` bills spread one minute apart going back from now,
+    cycling through `emails`. Bills have no items; listing views only need
+    the bill rows.
+    """
+    now = timezone.now()
+    with explicit_timestamps(Bill):
+        for start in range(0, count, batch_size):
+            Bill.objects.bulk_create([
+                Bill(
+                    customer_email=emails[i % len(emails)],
+                    total_price_without_tax=Decimal('100.00'),
+                    total_tax=Decimal('18.00'),
+                    net_price=Decimal('118.00'),
+                    rounded_net_price=Decimal('118.00'),
+                    amount_paid=Decimal('120.00'),
+                    balance=Decimal('2.00'),
+                    created_at=now - timedelta(minutes=i),
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+
+
+def seed_bill_lines(items_per_bill, batch_size=5000):
+    """
+    Give every bill without items `items_per_bill` items, cycling through the
+    catalogue, plus two balance denominations.
+    """
+    products = list(Product.objects.order_by('id'))
+    bill_ids = list(Bill.objects.filter(items__isnull=True).values_list('id', flat=True))
+    items = []
+    denominations = []
+    for n, bill_id in enumerate(bill_ids):
+        for i in range(items_per_bill):
+            product = products[(n + i) % len(products)]
+            tax_amount = product.price * product.tax_percentage / 100
+            items.append(BillItem(
+                bill_id=bill_id, product=product, quantity=1, unit_price=product.price,
+                tax_percentage=product.tax_percentage, tax_amount=tax_amount,
+                total_price=product.price + tax_amount,
+            ))
+        denominations += [
+            BalanceDenomination(bill_id=bill_id, value=2, count=1),
+            BalanceDenomination(bill_id=bill_id, value=1, count=1),
+        ]
+    BillItem.objects.bulk_create(items, batch_size=batch_size)
+    BalanceDenomination.objects.bulk_create(denominations, batch_size=batch_size)
+
+
+def exact_payment(lines):
+    """Rounded bill total for a basket, so a checkout returns no change"""
+    prices = {
+        product.product_id: product.price * (1 + product.tax_percentage / 100)
+        for product in Product.objects.filter(product_id__in=[pid for pid, _ in lines])
+    }
+    return math.ceil(sum(prices[pid] * qty for pid, qty in lines))
+
+
+def post_bill(client, customer_email, lines, amount_paid, denomination_counts=None, idempotency_key=None):
+    """POST a basket to generate_bill and return the response"""
+    headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+    return client.post(
+        '/generate-bill/',
+        data=json.dumps({
+            'customer_email': customer_email,
+            'bill_items': [{'product_id': pid, 'quantity': qty} for pid, qty in lines],
+            'denomination_counts': denomination_counts or {},
+            'amount_paid': amount_paid,
+        }),
+        content_type='application/json',
+        headers=headers,
+    )
+
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, elapsed milliseconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarise(samples):
+    """Median/p95 summary in milliseconds"""
+    return {
+        'median_ms': round(statistics.median(samples), 3) if samples else 0.0,
+        'p95_ms': round(percentile(samples, 95), 3),
+    }
@@ -0,0 +1,192 @@
+"""
+Cached product lookups for the scanner API.
+
+Catalogue data (name, price, tax, updated_at) lives in the cache for
+PRODUCT_CACHE_TIMEOUT seconds. Stock is kept in a separate, short-lived tier
+(PRODUCT_STOCK_CACHE_TIMEOUT seconds, or read live from the database when
+that setting is None). Admin edits invalidate both tiers through Product
+signals; checkouts refresh them with the values they just wrote, or drop
+the stock of sharded products, whose counters they do not read back.
+
+Rendered catalogue pages are cached under a catalogue version number that
+Product and ShopDenomination signals bump, so an edit retires every page
+rendered before it.
+
+Product searches (the products page and the admin) are prefix matches on
+product_id and Lower('name'), each a range on its index.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from .models import Product
+from .stock import with_counters
+
+# Cached for product IDs that do not exist, so repeated bad scans skip the database
+MISSING = 'missing'
+
+CATALOGUE_VERSION_KEY = 'catalogue-version'
+
+
+def prefix_q(field, prefix):
+    """
+    Match `field` starting with `prefix` as a range the field's index can
+    seek, instead of a LIKE that scans; startswith keeps the match exact
+    where the collation's order differs from plain prefixes.
+    """
+    bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': bound, f'{field}__startswith': prefix})
+
+
+def search_products(queryset, term):
+    """Products whose ID starts with `term`, or whose name does in any case"""
+    return queryset.alias(name_key=Lower('name')).filter(
+        prefix_q('product_id', term) | prefix_q('name_key', term.lower())
+    )
+
+
+def catalogue_version():
+    """Current catalogue version, for keys of cached catalogue pages"""
+    # Seed from the clock so a version lost to eviction never repeats an old one
+    return cache.get_or_set(CATALOGUE_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_catalogue_version():
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def catalogue_page_timeout():
+    """Stock on cached catalogue pages can lag checkouts by this many seconds"""
+    return getattr(settings, 'CATALOGUE_PAGE_CACHE_TIMEOUT', 60)
+
+
+def product_key(product_id):
+    return f'product:{product_id}'
+
+
+def stock_key(product_id):
+    return f'product-stock:{product_id}'
+
+
+def product_entry(product):
+    """The cacheable catalogue fields of a product"""
+    return {
+        'name': product.name,
+        'price': str(product.price),
+        'tax_percentage': str(product.tax_percentage),
+        'updated_at': product.updated_at,
+    }
+
+
+def info_timeout():
+    return getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300)
+
+
+def stock_timeout():
+    return getattr(settings, 'PRODUCT_STOCK_CACHE_TIMEOUT', 5)
+
+
+def cache_products(products):
+    """Write fresh entries for already-loaded products to both cache tiers"""
+    cache.set_many(
+        {product_key(product.product_id): product_entry(product) for product in products},
+        info_timeout()
+    )
+    if stock_timeout() is not None:
+        cache.set_many(
+            {stock_key(product.product_id): product.on_hand for product in products},
+            stock_timeout()
+        )
+
+
+def forget_stock(product_ids):
+    """Drop the stock tier for the given product IDs, so it is read again with the counters"""
+    cache.delete_many([stock_key(product_id) for product_id in product_ids])
+
+
+def invalidate_products(product_ids):
+    """Drop both cache tiers for the given product IDs"""
+    cache.delete_many(
+        [product_key(product_id) for product_id in product_ids]
+        + [stock_key(product_id) for product_id in product_ids]
+    )
+
+
+def get_product(product_id):
+    """
+    Return the product's catalogue entry plus 'available_stocks', or None if
+    there is no such product. Costs no queries when both tiers are warm.
+    """
+    entry = cache.get(product_key(product_id))
+    if entry is None:
+        product = with_counters(Product.objects.filter(product_id=product_id)).first()
+        if product is None:
+            cache.set(product_key(product_id), MISSING, info_timeout())
+            return None
+        cache_products([product])
+        return {**product_entry(product), 'available_stocks': product.on_hand}
+
+    if entry == MISSING:
+        return None
+
+    if stock_timeout() is None:
+        stock = None
+    else:
+        stock = cache.get(stock_key(product_id))
+    if stock is None:
+        stock = (
+            with_counters(Product.objects.filter(product_id=product_id))
+            .values_list(F('available_stocks') + F('counter_stock'), flat=True).first()
+        )
+        if stock is None:
+            # Deleted since it was cached
+            invalidate_products([product_id])
+            return None
+        if stock_timeout() is not None:
+            cache.set(stock_key(product_id), stock, stock_timeout())
+    return {**entry, 'available_stocks': stock}
+
+
+def get_products(product_ids):
+    """
+    Batch version of get_product. Returns (products, not_found): a dict of
+    product_id -> entry in request order, and the IDs that do not exist.
+    Everything not answered by the cache is fetched with one query.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    keys = [product_key(product_id) for product_id in product_ids]
+    if stock_timeout() is not None:
+        keys += [stock_key(product_id) for product_id in product_ids]
+    cached = cache.get_many(keys)
+
+    found = {}
+    not_found = []
+    uncached = []
+    for product_id in product_ids:
+        entry = cached.get(product_key(product_id))
+        stock = cached.get(stock_key(product_id))
+        if entry == MISSING:
+            not_found.append(product_id)
+        elif entry is None or stock is None:
+            uncached.append(product_id)
+        else:
+            found[product_id] = {**entry, 'available_stocks': stock}
+
+    if uncached:
+        products = list(with_counters(Product.objects.filter(product_id__in=uncached)))
+        cache_products(products)
+        for product in products:
+            found[product.product_id] = {**product_entry(product), 'available_stocks': product.on_hand}
+
+        missing = [product_id for product_id in uncached if product_id not in found]
+        cache.set_many({product_key(product_id): MISSING for product_id in missing}, info_timeout())
+        not_found += missing
+
+    ordered = {product_id: found[product_id] for product_id in product_ids if product_id in found}
+    not_found = set(not_found)
+    not_found = [product_id for product_id in product_ids if product_id in not_found]
+    return ordered, not_found
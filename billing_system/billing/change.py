@@ -0,0 +1,190 @@
+"""
+Change-making engines.
+
+An engine turns a balance and the shop's note inventory into the notes to
+hand back. Inventories are tuples of (value, count) pairs sorted by value,
+highest first, and results are lists of {'value': ..., 'count': ...} dicts
+in the same order, or None when the balance cannot be paid out.
+
+The engine used by generate_bill is chosen with the CHANGE_ENGINE setting.
+"""
+from collections import deque
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+INFINITY = float('inf')
+
+
+def snapshot_inventory(shop_denominations):
+    """Build an inventory tuple from ShopDenomination rows"""
+    return tuple(sorted(
+        ((denom.value, denom.count) for denom in shop_denominations if denom.count > 0),
+        reverse=True
+    ))
+
+
+def normalise_inventory(balance, inventory):
+    """
+    Drop notes that cannot take part in paying `balance` and cap each count at
+    balance // value. Counts above that cap never change the answer, so this
+    keeps cache keys stable while the shop's float grows and shrinks.
+    """
+    return tuple(
+        (value, min(count, balance // value))
+        for value, count in inventory
+        if value <= balance and count > 0
+    )
+
+
+def greedy_change(balance, inventory):
+    """
+    Highest note first. Returns (result, limited): `limited` is True when an
+    inventory count, rather than the balance, stopped a note from being used.
+    """
+    result = []
+    limited = False
+    for value, count in inventory:
+        if balance <= 0:
+            break
+
+        wanted = balance // value
+        used = min(wanted, count)
+        if used < wanted:
+            limited = True
+        if used > 0:
+            result.append({'value': value, 'count': used})
+            balance -= value * used
+
+    if balance > 0:
+        return None, limited
+    return result, limited
+
+
+@lru_cache(maxsize=None)
+def is_canonical(values):
+    """
+    True when greedy is optimal for every amount with unlimited notes of each
+    value. By Kozen and Zaks, a counterexample, if any, is smaller than the
+    sum of the two largest values, so checking up to there is sufficient.
+    """
+    if not values or 1 not in values:
+        return False
+    if len(values) < 3:
+        return True
+
+    limit = values[0] + values[1]
+    fewest = [0] + [0] * limit
+    for amount in range(1, limit + 1):
+        fewest[amount] = min(fewest[amount - value] + 1 for value in values if value <= amount)
+
+        greedy_notes = 0
+        remaining = amount
+        for value in values:
+            greedy_notes += remaining // value
+            remaining %= value
+        if greedy_notes != fewest[amount]:
+            return False
+    return True
+
+
+def bounded_change(balance, inventory):
+    """
+    Minimum number of notes paying exactly `balance` without exceeding any
+    inventory count (bounded coin change). Each value is folded in with a
+    sliding-window minimum per residue class, so the cost is
+    O(balance * number of values) regardless of how many notes are held.
+    """
+    fewest = [0] + [INFINITY] * balance
+    stages = []
+
+    for value, count in inventory:
+        count = min(count, balance // value)
+        updated = fewest[:]
+        used = [0] * (balance + 1)
+
+        for residue in range(min(value, balance + 1)):
+            window = deque()
+            for step, amount in enumerate(range(residue, balance + 1, value)):
+                # fewest[amount - k*value] + k == (fewest[...] - position) + step
+                candidate = fewest[amount] - step
+                while window and window[-1][1] >= candidate:
+                    window.pop()
+                window.append((step, candidate))
+                while window[0][0] < step - count:
+                    window.popleft()
+
+                position, best = window[0]
+                if best + step < updated[amount]:
+                    updated[amount] = best + step
+                    used[amount] = step - position
+
+        fewest = updated
+        stages.append(used)
+
+    if fewest[balance] == INFINITY:
+        return None
+
+    result = []
+    remaining = balance
+    for (value, _), used in zip(reversed(inventory), reversed(stages)):
+        notes = used[remaining]
+        if notes:
+            result.append({'value': value, 'count': notes})
+            remaining -= value * notes
+    result.reverse()
+    return result
+
+
+@lru_cache(maxsize=4096)
+def _optimal_change(balance, inventory):
+    values = tuple(value for value, _ in inventory)
+    if is_canonical(values):
+        # Greedy that was never cut short by inventory matches the unlimited
+        # optimum, which is a lower bound for the bounded problem
+        result, limited = greedy_change(balance, inventory)
+        if not limited:
+            return tuple((denom['value'], denom['count']) for denom in result)
+
+    result = bounded_change(balance, inventory)
+    if result is None:
+        return None
+    return tuple((denom['value'], denom['count']) for denom in result)
+
+
+class ChangeEngine:
+    """Base class for change-making strategies"""
+
+    def make_change(self, balance, inventory):
+        raise NotImplementedError
+
+
+class GreedyChangeEngine(ChangeEngine):
+    """Highest note first; may refuse balances a different mix could pay"""
+
+    def make_change(self, balance, inventory):
+        result, _ = greedy_change(balance, inventory)
+        return result
+
+
+class OptimalChangeEngine(ChangeEngine):
+    """
+    Fewest notes under inventory limits. Uses greedy when it is provably
+    optimal, falls back to bounded_change otherwise, and caches answers by
+    (balance, normalised inventory).
+    """
+
+    def make_change(self, balance, inventory):
+        if balance <= 0:
+            return []
+        result = _optimal_change(balance, normalise_inventory(balance, inventory))
+        if result is None:
+            return None
+        return [{'value': value, 'count': count} for value, count in result]
+
+
+def get_change_engine():
+    """Instantiate the engine configured by settings.CHANGE_ENGINE"""
+    return import_string(
+        getattr(settings, 'CHANGE_ENGINE', 'billing.change.OptimalChangeEngine')
+    )()
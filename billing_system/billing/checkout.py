@@ -0,0 +1,224 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .models import Product, BillItem, ShopDenomination
+from .catalogue import cache_products, forget_stock
+from .pricing import price_basket
+from .instrumentation import span
+from .stock import spread_counters, take_from_counters, with_counters
+
+
+class CheckoutError(Exception):
+    """Raised when a basket cannot be billed; the message is shown to the cashier"""
+
+
+def parse_bill_items(bill_items):
+    """
+    Normalise the raw `bill_items` payload into (product_id, quantity) pairs.
+    Rows without a product ID or with a non-positive quantity are skipped.
+    """
+    lines = []
+    for item_data in bill_items:
+        product_id = item_data.get('product_id', '').strip()
+        quantity = int(item_data.get('quantity', 0))
+
+        if not product_id or quantity <= 0:
+            continue
+
+        lines.append((product_id, quantity))
+    return lines
+
+
+def normalise_email(email):
+    """
+    Customer emails are stored and looked up lower-cased, so an address
+    typed with different capitalisation finds the same bills and summary.
+    """
+    return (email or '').strip().lower()
+
+
+def lock_products(product_ids):
+    """
+    Fetch and row-lock every product in the basket with a single query.
+    Rows are locked in product_id order so concurrent checkouts sharing
+    products always acquire locks in the same order and cannot deadlock.
+    Sharded products (see stock.py) are read with their counters but not
+    locked, at the cost of one more query for baskets that hold any.
+    """
+    product_ids = set(product_ids)
+    products = {
+        product.product_id: product
+        for product in Product.objects.select_for_update()
+        .filter(product_id__in=product_ids, stock_shards=0)
+        .order_by('product_id')
+    }
+    if len(products) < len(product_ids):
+        products.update(
+            (product.product_id, product)
+            for product in with_counters(
+                Product.objects.filter(product_id__in=product_ids - products.keys(), stock_shards__gt=0)
+            )
+        )
+    return products
+
+
+def check_stock(products, lines):
+    """
+    Validate a basket against locked products in memory.
+    Returns the total quantity requested per product ID.
+    """
+    requested = {}
+    for product_id, quantity in lines:
+        product = products.get(product_id)
+        if product is None:
+            raise CheckoutError(f'Product {product_id} not found')
+
+        requested[product_id] = requested.get(product_id, 0) + quantity
+        if not product.is_available(requested[product_id]):
+            raise CheckoutError(
+                f'Insufficient stock for {product.name}. Available: {product.on_hand}'
+            )
+    return requested
+
+
+def price_bill_items(bill, products, lines):
+    """
+    Build unsaved BillItems for a basket.
+    Returns (items, totals) with totals as computed by pricing.price_basket.
+    """
+    priced, totals = price_basket(
+        (products[product_id].price, quantity, products[product_id].tax_percentage)
+        for product_id, quantity in lines
+    )
+    items = [
+        BillItem(
+            bill=bill,
+            product=products[product_id],
+            quantity=line['quantity'],
+            unit_price=line['unit_price'],
+            tax_percentage=line['tax_percentage'],
+            tax_amount=line['tax_amount'],
+            total_price=line['total_price']
+        )
+        for (product_id, _), line in zip(lines, priced)
+    ]
+    return items, totals
+
+
+def take_stock(products, requested):
+    """
+    Decrement the in-memory stock of locked products, and of sharded ones
+    loaded by stock.gather_counters; returns the products changed
+    """
+    now = timezone.now()
+    sold = []
+    for product_id, quantity in requested.items():
+        product = products[product_id]
+        if product.stock_shards:
+            product.counter_stock -= quantity
+        else:
+            product.available_stocks -= quantity
+            product.updated_at = now
+        sold.append(product)
+    return sold
+
+
+def save_stock(sold):
+    """Write stock for the products sold in one bulk UPDATE, and deal sharded stock back out"""
+    Product.objects.bulk_update(
+        [product for product in sold if not product.stock_shards], ['available_stocks', 'updated_at']
+    )
+    spread_counters([product for product in sold if product.stock_shards])
+
+    # bulk_update sends no signals; refresh the lookup cache once committed
+    transaction.on_commit(lambda: cache_products(sold))
+
+
+def create_bill_items(bill, lines):
+    """
+    Validate stock, write bill items and decrement stock for a whole basket.
+    Issues a constant number of queries regardless of basket size: one locked
+    SELECT, one bulk INSERT and one bulk UPDATE, plus one SELECT and one
+    UPDATE per sharded product (see stock.py).
+    Returns (items, totals, shards): totals as computed by
+    pricing.price_basket, and the stock counter each sharded product was
+    taken from, by product pk, for reports.record_sales.
+    """
+    with span('stock'):
+        products = lock_products(product_id for product_id, _ in lines)
+
+        # Validate every line in memory before writing anything; sharded
+        # stock was read unlocked, so its counters have the final say
+        requested = check_stock(products, lines)
+        sharded = {
+            product_id: quantity for product_id, quantity in requested.items() if products[product_id].stock_shards
+        }
+        shards, short = take_from_counters(products, sharded)
+        if short is not None:
+            raise CheckoutError(f'Insufficient stock for {short.name}. Available: {short.on_hand}')
+        if sharded:
+            transaction.on_commit(lambda: forget_stock(sharded))
+    with span('pricing'):
+        items, totals = price_bill_items(bill, products, lines)
+    BillItem.objects.bulk_create(items)
+
+    # The rows are locked, so the in-memory stock values are current
+    with span('stock'):
+        save_stock(take_stock(products, {
+            product_id: quantity for product_id, quantity in requested.items() if product_id not in sharded
+        }))
+    return items, totals, shards
+
+
+def parse_denomination_counts(denomination_counts):
+    """
+    Normalise the raw `denomination_counts` payload into note counts keyed by
+    denomination value as a string. Raises ValueError on a negative count.
+    """
+    counts = {}
+    for value, count in denomination_counts.items():
+        count = int(count)
+        if count < 0:
+            raise ValueError(f'Negative count for denomination {value}')
+        counts[str(value)] = count
+    return counts
+
+
+def parse_tendered(denomination_counts, shop_denominations):
+    """Count of each shop denomination handed over by the customer, by value"""
+    tendered = {}
+    for denom in shop_denominations:
+        count = int(denomination_counts.get(str(denom.value), 0))
+        if count:
+            tendered[denom.value] = count
+    return tendered
+
+
+def apply_denomination_deltas(tendered, balance_denoms):
+    """
+    Add the tendered notes to the shop and take out the notes returned as
+    change, in one UPDATE touching only the denominations that changed.
+    Counts are adjusted with F() expressions so concurrent checkouts cannot
+    overwrite each other, and a row is only updated if its count stays
+    non-negative; if any row is refused, the whole basket is rejected.
+    """
+    deltas = dict(tendered)
+    for denom_data in balance_denoms:
+        deltas[denom_data['value']] = deltas.get(denom_data['value'], 0) - denom_data['count']
+    deltas = {value: delta for value, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    delta = Case(
+        *[When(value=value, then=Value(count)) for value, count in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    updated = (
+        ShopDenomination.objects.filter(value__in=deltas)
+        .alias(new_count=F('count') + delta)
+        .filter(new_count__gte=0)
+        .update(count=F('count') + delta)
+    )
+    if updated != len(deltas):
+        raise CheckoutError('Insufficient denominations available to return balance')
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Subquery
+from django.utils import timezone
+from .models import InvoiceEmail
+
+
+def invoice_subject(bill):
+    return f'Invoice #{bill.id} - Thank you for your purchase'
+
+
+def queue_invoice_email(bill, message):
+    """
+    Write the invoice email, with `message` as rendered by invoices.store_invoices,
+    to the outbox. Call inside the transaction that creates the bill so the
+    email is queued if and only if the bill commits; delivery happens in
+    send_invoice_emails.
+    """
+    return InvoiceEmail.objects.create(
+        bill=bill,
+        recipient=bill.customer_email,
+        subject=invoice_subject(bill),
+        body=message
+    )
+
+
+def queue_invoice_emails(invoices):
+    """
+    Write invoice emails for many new bills with one INSERT.
+    `invoices` holds (bill, message) pairs.
+    """
+    return InvoiceEmail.objects.bulk_create([
+        InvoiceEmail(
+            bill=bill,
+            recipient=bill.customer_email,
+            subject=invoice_subject(bill),
+            body=message
+        )
+        for bill, message in invoices
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff before the next delivery attempt"""
+    base = getattr(settings, 'INVOICE_EMAIL_RETRY_BACKOFF', 60)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def claim_due_emails(batch_size, now):
+    """
+    Claim up to `batch_size` due outbox entries for this worker by moving
+    their next attempt INVOICE_EMAIL_CLAIM_TIMEOUT seconds ahead, so other
+    workers polling meanwhile pass over them. Entries of a worker that dies
+    while sending come due again once the claim runs out.
+    """
+    claimed_until = now + timedelta(seconds=getattr(settings, 'INVOICE_EMAIL_CLAIM_TIMEOUT', 300))
+    due = InvoiceEmail.objects.filter(status=InvoiceEmail.STATUS_PENDING, next_attempt_at__lte=now)
+    with transaction.atomic():
+        # The guarded UPDATE is the first statement: it takes the row locks
+        # (the write lock on SQLite), and a worker racing for the same rows
+        # finds them no longer due once it gets them
+        due.filter(
+            pk__in=Subquery(due.order_by('next_attempt_at', 'id').values('pk')[:batch_size])
+        ).update(next_attempt_at=claimed_until)
+        return list(
+            InvoiceEmail.objects.filter(status=InvoiceEmail.STATUS_PENDING, next_attempt_at=claimed_until)
+            .order_by('id')
+        )
+
+
+def deliver_pending_emails(batch_size=100, connection=None):
+    """
+    Claim one batch of due outbox entries and send it over a single mail
+    connection. Returns (sent, failed) counts for the batch.
+    """
+    max_attempts = getattr(settings, 'INVOICE_EMAIL_MAX_ATTEMPTS', 5)
+    outbox = claim_due_emails(batch_size, timezone.now())
+    if not outbox:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Mail server unreachable: count it as a failed attempt for the whole batch
+        connection = None
+        error = str(e)
+
+    for entry in outbox:
+        entry.attempts += 1
+        if connection is not None:
+            email = EmailMessage(
+                entry.subject,
+                entry.body,
+                settings.DEFAULT_FROM_EMAIL,
+                [entry.recipient],
+                connection=connection
+            )
+            try:
+                connection.send_messages([email])
+            except Exception as e:
+                error = str(e)
+            else:
+                entry.status = InvoiceEmail.STATUS_SENT
+                entry.sent_at = timezone.now()
+                entry.last_error = ''
+                sent += 1
+                continue
+
+        entry.last_error = error
+        if entry.attempts >= max_attempts:
+            entry.status = InvoiceEmail.STATUS_FAILED
+            failed += 1
+        else:
+            entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+
+    if connection is not None:
+        connection.close()
+
+    InvoiceEmail.objects.bulk_update(
+        outbox, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+    return sent, failed
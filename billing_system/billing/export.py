@@ -0,0 +1,182 @@
+"""
+Constant-memory bill export.
+
+Bills are read with QuerySet.iterator(chunk_size=...) (a server-side cursor
+on PostgreSQL) and their items and balance denominations are prefetched one
+chunk at a time, so memory use depends on the chunk size, not on history.
+Archived bills are read the same way, with their lines and change taken from
+the archived snapshot, and merged in by date.
+"""
+import csv
+import heapq
+import json
+from datetime import datetime, time, timedelta
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .archive import unpack_snapshot
+from .models import ArchivedBill, Bill, BillItem
+from .checkout import normalise_email
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+CSV_HEADER = [
+    'bill_id', 'created_at', 'customer_email', 'total_price_without_tax', 'total_tax',
+    'net_price', 'rounded_net_price', 'amount_paid', 'balance', 'balance_denominations',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'tax_percentage',
+    'tax_amount', 'total_price',
+]
+
+
+def parse_export_date(value):
+    """Parse an optional YYYY-MM-DD filter; raises ValueError if malformed"""
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'Invalid date: {value}. Use YYYY-MM-DD')
+    return parsed
+
+
+def _filter_export(bills, start, end, email):
+    if start:
+        bills = bills.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        bills = bills.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        )
+    if email:
+        bills = bills.filter(customer_email=normalise_email(email))
+    return bills.order_by('created_at', 'id')
+
+
+def export_queryset(start=None, end=None, email=None):
+    """
+    Bills created between the `start` and `end` dates (both inclusive),
+    optionally for one customer, oldest first.
+    """
+    return _filter_export(Bill.objects.all(), start, end, email).prefetch_related(
+        Prefetch('items', queryset=BillItem.objects.select_related('product')),
+        'balance_denominations',
+    )
+
+
+def archived_export_queryset(start=None, end=None, email=None):
+    """The archived bills export_queryset would select if they were still live"""
+    return _filter_export(ArchivedBill.objects.all(), start, end, email)
+
+
+def bill_record(bill):
+    return {
+        'bill_id': bill.id,
+        'created_at': bill.created_at.isoformat(),
+        'customer_email': bill.customer_email,
+        'total_price_without_tax': str(bill.total_price_without_tax),
+        'total_tax': str(bill.total_tax),
+        'net_price': str(bill.net_price),
+        'rounded_net_price': str(bill.rounded_net_price),
+        'amount_paid': str(bill.amount_paid),
+        'balance': str(bill.balance),
+        'items': [
+            {
+                'product_id': item.product.product_id,
+                'product_name': item.product.name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'tax_percentage': str(item.tax_percentage),
+                'tax_amount': str(item.tax_amount),
+                'total_price': str(item.total_price),
+            }
+            for item in bill.items.all()
+        ],
+        'balance_denominations': [
+            {'value': bd.value, 'count': bd.count}
+            for bd in bill.balance_denominations.all()
+        ],
+    }
+
+
+def archived_record(bill):
+    """The export record of an archived bill, from its snapshot; the same shape as bill_record's"""
+    snapshot = unpack_snapshot(bill.document)
+    return {
+        'bill_id': bill.id,
+        'created_at': bill.created_at.isoformat(),
+        'customer_email': bill.customer_email,
+        'total_price_without_tax': snapshot['total_price_without_tax'],
+        'total_tax': snapshot['total_tax'],
+        'net_price': snapshot['net_price'],
+        'rounded_net_price': snapshot['rounded_net_price'],
+        'amount_paid': snapshot['amount_paid'],
+        'balance': snapshot['balance'],
+        'items': [
+            {
+                'product_id': line['product_id'],
+                'product_name': line['name'],
+                'quantity': line['quantity'],
+                'unit_price': line['unit_price'],
+                'tax_percentage': line['tax_percentage'],
+                'tax_amount': line['tax_amount'],
+                'total_price': line['total_price'],
+            }
+            for line in snapshot['lines']
+        ],
+        'balance_denominations': snapshot['change'],
+    }
+
+
+def iter_bill_records(bills, chunk_size=2000, archived=None):
+    """
+    Yield one plain dict per bill, with its items and balance denominations.
+    Bills of the `archived` queryset, if given, are merged in by creation time.
+    """
+    streams = [((bill.created_at, bill.id, bill_record(bill)) for bill in bills.iterator(chunk_size=chunk_size))]
+    if archived is not None:
+        streams.append(
+            (bill.created_at, bill.id, archived_record(bill)) for bill in archived.iterator(chunk_size=chunk_size)
+        )
+    for *_, record in heapq.merge(*streams, key=lambda row: row[:2]):
+        yield record
+
+
+def iter_jsonl(records):
+    """One JSON document per line"""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+class _LineBuffer:
+    """File-like object whose write() hands the formatted line straight back"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(records):
+    """
+    One CSV row per bill item, with the bill columns repeated on every row.
+    Balance denominations are packed into one column as 'value x count' pairs.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(CSV_HEADER)
+    for record in records:
+        denominations = ';'.join(f"{bd['value']}x{bd['count']}" for bd in record['balance_denominations'])
+        bill_columns = [
+            record['bill_id'], record['created_at'], record['customer_email'],
+            record['total_price_without_tax'], record['total_tax'], record['net_price'],
+            record['rounded_net_price'], record['amount_paid'], record['balance'], denominations,
+        ]
+        for item in record['items'] or [None]:
+            item_columns = ['', '', '', '', '', '', ''] if item is None else [
+                item['product_id'], item['product_name'], item['quantity'], item['unit_price'],
+                item['tax_percentage'], item['tax_amount'], item['total_price'],
+            ]
+            yield writer.writerow(bill_columns + item_columns)
+
+
+def iter_export(export_format, bills, chunk_size=2000, archived=None):
+    """Serialised export lines for `bills`, and `archived` bills, in the requested format"""
+    records = iter_bill_records(bills, chunk_size=chunk_size, archived=archived)
+    if export_format == 'csv':
+        return iter_csv(records)
+    return iter_jsonl(records)
@@ -0,0 +1,202 @@
+"""
+Bulk bill ingestion for offline POS terminals.
+
+Terminals queue sales while offline and replay them as JSONL, one bill per
+line, each carrying an idempotency_key. ingest_bills validates a chunk of
+bills in memory against locked stock and shop notes, then writes the whole
+chunk with a fixed number of bulk queries in one transaction. A key that
+has already been billed reports the existing bill instead of charging again.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils import timezone
+from .models import Bill, BillItem, BalanceDenomination, ShopDenomination
+from .archive import bills_by_key
+from .checkout import (
+    CheckoutError, parse_bill_items, normalise_email, lock_products, check_stock, price_bill_items,
+    take_stock, save_stock, parse_tendered, apply_denomination_deltas
+)
+from .change import get_change_engine, snapshot_inventory
+from .emails import queue_invoice_emails
+from .invoices import store_invoices
+from .reports import add_sales
+from .snapshots import build_snapshot
+from .stock import gather_counters
+from .summaries import record_purchases
+
+
+def parse_record(text):
+    """Decode one JSONL line into a sale dict; raises CheckoutError if it is unusable"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise CheckoutError('Invalid JSON')
+    if not isinstance(data, dict):
+        raise CheckoutError('Each line must be a JSON object')
+
+    key = str(data.get('idempotency_key') or '').strip()
+    if not key:
+        raise CheckoutError('idempotency_key is required')
+    if len(key) > 100:
+        raise CheckoutError('idempotency_key must be at most 100 characters')
+
+    sale = {'key': key, 'customer_email': normalise_email(str(data.get('customer_email') or ''))}
+    if not sale['customer_email']:
+        raise CheckoutError('Customer email is required')
+    try:
+        sale['lines'] = parse_bill_items(data.get('bill_items') or [])
+        sale['amount_paid'] = Decimal(str(data.get('amount_paid', 0)))
+    except (ValueError, TypeError, AttributeError, InvalidOperation):
+        raise CheckoutError('Invalid bill_items or amount_paid')
+    # NaN and Infinity parse, but cannot be compared with a bill's total
+    if not sale['amount_paid'].is_finite():
+        raise CheckoutError('amount_paid must be a finite number')
+    if not sale['lines']:
+        raise CheckoutError('At least one product is required')
+    sale['denomination_counts'] = data.get('denomination_counts') or {}
+    return sale
+
+
+def ingest_bills(lines, chunk_size=100):
+    """
+    Bill every sale in an iterable of JSONL lines, `chunk_size` sales per
+    transaction. Yields one outcome per non-blank line, in input order:
+    {'line', 'idempotency_key', 'status', 'bill_id', 'error'} where status
+    is 'created', 'duplicate' or 'error'.
+    """
+    chunk = []
+    for number, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        chunk.append((number, text))
+        if len(chunk) == chunk_size:
+            yield from _ingest_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _ingest_chunk(chunk)
+
+
+def _outcome(number, key, status, bill_id=None, error=None):
+    return {'line': number, 'idempotency_key': key, 'status': status, 'bill_id': bill_id, 'error': error}
+
+
+@transaction.atomic
+def _ingest_chunk(chunk):
+    outcomes = {}
+    sales = []
+    for number, text in chunk:
+        try:
+            sales.append((number, parse_record(text)))
+        except CheckoutError as e:
+            outcomes[number] = _outcome(number, None, 'error', error=str(e))
+
+    existing = bills_by_key(sale['key'] for _, sale in sales)
+    products = lock_products(
+        product_id for _, sale in sales if sale['key'] not in existing for product_id, _ in sale['lines']
+    )
+    # The whole chunk is checked in memory, so sharded products are locked with all their counters
+    gather_counters([product for product in products.values() if product.stock_shards])
+    shop_denominations = list(ShopDenomination.objects.select_for_update().order_by('value'))
+    engine = get_change_engine()
+
+    # Replay the chunk in memory against the locked stock and notes
+    accepted = []
+    first_number = {}
+    sold = {}
+    tendered_total = {}
+    returned_total = {}
+    for number, sale in sales:
+        key = sale['key']
+        if key in existing or key in first_number:
+            continue
+        try:
+            bill, items, balance_denoms, tendered, products_sold = _bill_sale(
+                sale, products, shop_denominations, engine
+            )
+        except CheckoutError as e:
+            outcomes[number] = _outcome(number, key, 'error', error=str(e))
+            continue
+
+        sold.update((product.product_id, product) for product in products_sold)
+        for value, count in tendered.items():
+            tendered_total[value] = tendered_total.get(value, 0) + count
+        for bd in balance_denoms:
+            returned_total[bd.value] = returned_total.get(bd.value, 0) + bd.count
+        first_number[key] = number
+        accepted.append((number, sale, bill, items, balance_denoms))
+
+    if accepted:
+        Bill.objects.bulk_create([bill for _, _, bill, _, _ in accepted])
+        BillItem.objects.bulk_create([item for *_, items, _ in accepted for item in items])
+        BalanceDenomination.objects.bulk_create([bd for *_, balance_denoms in accepted for bd in balance_denoms])
+        save_stock(list(sold.values()))
+        apply_denomination_deltas(
+            tendered_total, [{'value': value, 'count': count} for value, count in returned_total.items()]
+        )
+
+        record_purchases([(bill, sale['lines']) for _, sale, bill, _, _ in accepted])
+        by_day = {}
+        for *_, bill, items, _ in accepted:
+            by_day.setdefault(timezone.localdate(bill.created_at), []).extend(items)
+        for day, items in by_day.items():
+            add_sales(day, items)
+        invoices = store_invoices([bill for _, _, bill, _, _ in accepted])
+        queue_invoice_emails([(bill, invoices[bill.id]) for _, _, bill, _, _ in accepted])
+
+        for number, sale, bill, _, _ in accepted:
+            outcomes[number] = _outcome(number, sale['key'], 'created', bill.id)
+            existing[sale['key']] = bill.id
+
+    # Replays of a key already billed, before this chunk or earlier in it
+    for number, sale in sales:
+        if number not in outcomes:
+            outcomes[number] = _outcome(number, sale['key'], 'duplicate', existing[sale['key']])
+
+    return [outcomes[number] for number, _ in chunk]
+
+
+def _bill_sale(sale, products, shop_denominations, engine):
+    """
+    Price one sale and choose its change without writing anything.
+    `products` and `shop_denominations` hold the stock and notes left after
+    the sales accepted so far, and are only updated if this sale is accepted.
+    """
+    requested = check_stock(products, sale['lines'])
+    try:
+        tendered = parse_tendered(sale['denomination_counts'], shop_denominations)
+    except (ValueError, TypeError, AttributeError):
+        raise CheckoutError('Invalid denomination_counts')
+
+    bill = Bill(customer_email=sale['customer_email'], amount_paid=sale['amount_paid'],
+                idempotency_key=sale['key'])
+    items, totals = price_bill_items(bill, products, sale['lines'])
+    bill.total_price_without_tax = totals['total_price_without_tax']
+    bill.total_tax = totals['total_tax']
+    bill.net_price = totals['net_price']
+    bill.rounded_net_price = totals['rounded_net_price']
+    bill.balance = sale['amount_paid'] - totals['rounded_net_price']
+    if bill.balance < 0:
+        raise CheckoutError('Insufficient payment amount')
+
+    balance_denoms = []
+    if bill.balance > 0:
+        inventory = snapshot_inventory(
+            ShopDenomination(value=denom.value, count=denom.count + tendered.get(denom.value, 0))
+            for denom in shop_denominations
+        )
+        change = engine.make_change(int(bill.balance), inventory)
+        if change is None:
+            raise CheckoutError('Insufficient denominations available to return balance')
+        balance_denoms = [
+            BalanceDenomination(bill=bill, value=denom_data['value'], count=denom_data['count'])
+            for denom_data in change
+        ]
+
+    bill.snapshot = build_snapshot(bill, items, balance_denoms)
+
+    # Tendered notes join the drawer straight away and can be change for later sales
+    returned = {bd.value: bd.count for bd in balance_denoms}
+    for denom in shop_denominations:
+        denom.count += tendered.get(denom.value, 0) - returned.get(denom.value, 0)
+    return bill, items, balance_denoms, tendered, take_stock(products, requested)
@@ -0,0 +1,184 @@
+"""
+Per-request timing.
+
+RequestMetricsMiddleware times each request, counts and times its SQL,
+and collects named spans recorded with `span`. Every response gets a
+Server-Timing header, and the measurements feed in-process histograms
+that /metrics serves in the Prometheus text format. Each worker process
+keeps its own histograms, so scrape every worker.
+"""
+import threading
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.shortcuts import render as django_render
+
+_current = ContextVar('billing_request_metrics', default=None)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 15, 20, 30, 50, 100)
+
+
+class RequestMetrics:
+    """SQL and span timings for one request; also the execute_wrapper that times its SQL"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.spans = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_seconds += time.perf_counter() - start
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self, total_seconds):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [
+            f'total;dur={total_seconds * 1000:.1f}',
+            f'sql;desc="queries={self.sql_count}";dur={self.sql_seconds * 1000:.1f}',
+        ]
+        entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items()]
+        return ', '.join(entries)
+
+
+def activate(metrics):
+    """Make `metrics` the current request's; returns a token for deactivate"""
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+class span(ContextDecorator):
+    """
+    Time a block, or every call of a decorated function, as a named span of
+    the current request. Outside a request it does nothing.
+    Spans with the same name add up.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent calls do not share _start
+        return span(self.name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add_span(self.name, time.perf_counter() - self._start)
+        return False
+
+
+def render(request, template_name, context=None, *args, **kwargs):
+    """django.shortcuts.render, timed as the 'template' span"""
+    with span('template'):
+        return django_render(request, template_name, context, *args, **kwargs)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram keyed by label values"""
+
+    def __init__(self, name, documentation, labels, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, bound)} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, "+Inf")} {series["count"]}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {series["count"]}')
+        return lines
+
+
+class CounterMetric:
+    """Thread-safe Prometheus counter keyed by label values"""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            lines += [
+                f'{self.name}{_labels(self.labels, label_values)} {value}'
+                for label_values, value in sorted(self._values.items())
+            ]
+        return lines
+
+
+REQUESTS = CounterMetric('billing_requests_total', 'Requests handled', ('view', 'method', 'status'))
+REQUEST_SECONDS = Histogram('billing_request_duration_seconds', 'Request wall time', ('view', 'method'))
+SQL_QUERIES = Histogram('billing_request_sql_queries', 'SQL statements per request', ('view',), QUERY_BUCKETS)
+SQL_SECONDS = Histogram('billing_request_sql_seconds', 'Time in SQL per request', ('view',))
+SPAN_SECONDS = Histogram('billing_span_duration_seconds', 'Time in named spans per request', ('view', 'span'))
+METRICS = [REQUESTS, REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, SPAN_SECONDS]
+
+
+def record_request(view, method, status, total_seconds, metrics):
+    REQUESTS.inc(view, method, str(status))
+    REQUEST_SECONDS.observe(total_seconds, view, method)
+    SQL_QUERIES.observe(metrics.sql_count, view)
+    SQL_SECONDS.observe(metrics.sql_seconds, view)
+    for name, seconds in metrics.spans.items():
+        SPAN_SECONDS.observe(seconds, view, name)
+
+
+def expose_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines += metric.expose()
+    return '\n'.join(lines) + '\n'
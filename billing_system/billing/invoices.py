@@ -0,0 +1,199 @@
+"""
+Pre-rendered invoice documents.
+
+An invoice is rendered once, as text for the email and as HTML for the bill
+page, from the bill's snapshot, and stored zlib-compressed in an
+InvoiceDocument next to the bill. The email outbox, bill_detail and the
+reprint_invoices command all reuse it instead of rendering from the bill's
+rows again.
+
+Documents carry INVOICE_VERSION. Bump it whenever invoice.html, the text
+layout or snapshots.SNAPSHOT_VERSION changes: older documents are rendered
+again on their next read (or in bulk with reprint_invoices), and the new
+version retires every cached page and ETag.
+"""
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from .archive import archived_receipt
+from .models import InvoiceDocument
+from .snapshots import SNAPSHOT_VERSION, get_bill_snapshot, rebuild_snapshot, snapshot_cache_timeout
+
+INVOICE_VERSION = 1
+
+
+def receipt_for(bill):
+    """The data an invoice is rendered from, for a bill whose snapshot is in memory"""
+    return {'id': bill.id, 'customer_email': bill.customer_email, 'created_at': bill.created_at, **bill.snapshot}
+
+
+def render_invoice_text(receipt):
+    items_text = '\n'.join([
+        f"  {line['name']} x {line['quantity']} @ ₹{line['unit_price']} = ₹{line['total_price']}"
+        for line in receipt['lines']
+    ])
+
+    balance_text = ''
+    if receipt['change']:
+        balance_denoms = '\n'.join([f"  ₹{bd['value']} x {bd['count']}" for bd in receipt['change']])
+        balance_text = f"\n\nBalance Denominations:\n{balance_denoms}"
+
+    return f"""
+Dear Customer,
+
+Thank you for your purchase!
+
+Invoice #: {receipt['id']}
+Date: {receipt['created_at'].strftime('%Y-%m-%d %H:%M:%S')}
+
+Items Purchased:
+{items_text}
+
+Total (without tax): ₹{receipt['total_price_without_tax']}
+Total Tax: ₹{receipt['total_tax']}
+Net Price: ₹{receipt['net_price']}
+Rounded Price: ₹{receipt['rounded_net_price']}
+Amount Paid: ₹{receipt['amount_paid']}
+Balance: ₹{receipt['balance']}{balance_text}
+
+Thank you for shopping with us!
+
+Best regards,
+Billing System
+    """
+
+
+def render_invoice(receipt):
+    """(text, html) of the invoice for a receipt from receipt_for, get_bill_snapshot or archive.bill_receipt"""
+    return render_invoice_text(receipt), render_to_string('billing/invoice.html', {'bill': receipt})
+
+
+def compress(text):
+    return zlib.compress(text.encode())
+
+
+def decompress(data):
+    return zlib.decompress(data).decode()
+
+
+def render_document(receipt):
+    """
+    Render one invoice and return (bill_id, text, html) with compressed
+    bodies. Touches no database, so it can run in a worker process.
+    """
+    text, html = render_invoice(receipt)
+    return receipt['id'], compress(text), compress(html)
+
+
+def save_documents(documents):
+    """Write (bill_id, text, html) documents, replacing any older rendering, with one query"""
+    InvoiceDocument.objects.bulk_create(
+        [
+            InvoiceDocument(bill_id=bill_id, version=INVOICE_VERSION, text=text, html=html)
+            for bill_id, text, html in documents
+        ],
+        update_conflicts=True,
+        unique_fields=['bill'],
+        update_fields=['version', 'text', 'html'],
+    )
+
+
+def store_invoices(bills):
+    """
+    Render and store the invoices of new bills, whose snapshots are in memory,
+    with one INSERT. Returns the text of each invoice by bill ID, for the
+    email outbox.
+    """
+    texts = {}
+    documents = []
+    for bill in bills:
+        text, html = render_invoice(receipt_for(bill))
+        texts[bill.id] = text
+        documents.append(
+            InvoiceDocument(bill=bill, version=INVOICE_VERSION, text=compress(text), html=compress(html))
+        )
+    InvoiceDocument.objects.bulk_create(documents)
+    return texts
+
+
+def reprint_invoices(bills, workers=1, chunk_size=500):
+    """
+    Render the invoices of the `bills` queryset again and store them,
+    `chunk_size` bills at a time, spread over `workers` processes. Yields
+    the (bill_id, text, html) documents, bodies compressed, as they are
+    stored. Workers only render; reading snapshots and writing documents
+    stays in this process.
+    """
+    rows = bills.values('id', 'customer_email', 'created_at', 'snapshot').order_by('created_at', 'id')
+    # Spawned, not forked: forked workers would share this process's database connection
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+    ) if workers > 1 else None
+    try:
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            snapshot = row.pop('snapshot')
+            if not snapshot or snapshot.get('version') != SNAPSHOT_VERSION:
+                snapshot = rebuild_snapshot(row['id'])
+            chunk.append({**row, **snapshot})
+            if len(chunk) == chunk_size:
+                yield from _reprint_chunk(chunk, pool, workers)
+                chunk = []
+        if chunk:
+            yield from _reprint_chunk(chunk, pool, workers)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def _reprint_chunk(receipts, pool, workers):
+    if pool is None:
+        documents = [render_document(receipt) for receipt in receipts]
+    else:
+        documents = list(pool.map(render_document, receipts, chunksize=max(1, len(receipts) // (workers * 4))))
+    save_documents(documents)
+    return documents
+
+
+def bill_etag(bill_id):
+    """Strong ETag of a bill page; its content only changes with INVOICE_VERSION"""
+    return f'"bill-{bill_id}-v{INVOICE_VERSION}"'
+
+
+def invoice_key(bill_id):
+    return f'invoice-html:{INVOICE_VERSION}:{bill_id}'
+
+
+def get_invoice_html(bill_id):
+    """
+    The invoice HTML of a bill, or None if there is no such bill. Served from
+    the cache, else from the stored document in one query; bills without a
+    current document get one rendered from their snapshot on the way, and
+    archived bills are rendered from the archive.
+    """
+    key = invoice_key(bill_id)
+    html = cache.get(key)
+    if html is None:
+        html = (
+            InvoiceDocument.objects.filter(bill_id=bill_id, version=INVOICE_VERSION)
+            .values_list('html', flat=True).first()
+        )
+        if html is None:
+            receipt = get_bill_snapshot(bill_id)
+            if receipt is not None:
+                document = render_document(receipt)
+                save_documents([document])
+                html = document[2]
+            else:
+                # Archived bills have no document; render from the archived snapshot
+                receipt = archived_receipt(bill_id)
+                if receipt is None:
+                    return None
+                html = compress(render_invoice(receipt)[1])
+        # Cached compressed; PostgreSQL returns memoryviews, which do not pickle
+        html = bytes(html)
+        cache.set(key, html, snapshot_cache_timeout())
+    return decompress(html)
@@ -0,0 +1,187 @@
+"""
+Concurrent checkout load harness.
+
+run_checkout_load drives generate_bill from a pool of threads, each with
+its own test client and database connection, and measures how checkouts
+contend: latency percentiles, time spent in statements that take locks,
+and the checkouts that rolled back. Results are a plain dict so they can
+be written as JSON and diffed between releases.
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.db import connection
+from django.test import Client
+
+from .bench import post_bill, percentile
+from .models import Bill, Product
+from .pricing import price_basket
+from .stock import with_counters
+
+# Statements that wait for a lock when checkouts collide: row locks on
+# PostgreSQL, and the database write lock that SQLite takes on first write
+LOCK_KINDS = ('select_for_update', 'update', 'insert')
+
+
+def lock_kind(sql):
+    """The LOCK_KINDS entry a statement belongs to, or None"""
+    statement = sql.lstrip()[:6].upper()
+    if statement == 'SELECT':
+        return 'select_for_update' if 'FOR UPDATE' in sql.upper() else None
+    if statement in ('UPDATE', 'INSERT'):
+        return statement.lower()
+    return None
+
+
+class LockTimer:
+    """execute_wrapper recording how long each locking statement took"""
+
+    def __init__(self):
+        self.samples = {kind: [] for kind in LOCK_KINDS}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            kind = lock_kind(sql)
+            if kind:
+                self.samples[kind].append((time.perf_counter() - start) * 1000)
+
+
+def database_profile():
+    """Vendor and connection settings of the default database"""
+    profile = {'vendor': connection.vendor, 'conn_max_age': connection.settings_dict['CONN_MAX_AGE']}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                profile[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+    return profile
+
+
+def latency_summary(samples):
+    return {
+        'p50': round(percentile(samples, 50), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+        'max': round(max(samples, default=0.0), 3),
+    }
+
+
+def basket_picker(product_ids, items, hot_products, hot_share, seed):
+    """
+    Return a function producing random baskets of `items` distinct products.
+    Each line is one of the first `hot_products` products with probability
+    `hot_share`, so a high share concentrates checkouts on a few rows.
+    """
+    rng = random.Random(seed)
+    hot, cold = product_ids[:hot_products], product_ids[hot_products:]
+
+    def pick():
+        chosen = set()
+        while len(chosen) < items:
+            pool = hot if hot and (not cold or rng.random() < hot_share) else cold
+            chosen.add(rng.choice(pool))
+        return [(product_id, rng.randint(1, 3)) for product_id in sorted(chosen)]
+    return rng, pick
+
+
+def run_checkout_load(product_ids, customer_emails, workers=8, checkouts=25, items=5,
+                      hot_products=5, hot_share=0.0, cash_share=0.0, lock_wait_ms=10.0):
+    """
+    Run `workers` threads of `checkouts` checkouts each and return the results.
+    Worker n bills customer_emails[n % len(customer_emails)]; several emails
+    keep checkouts from queueing on one customer's summary row.
+    A `cash_share` of checkouts pay with 500 notes and need change, which
+    exercises the shop's denominations; the rest pay the exact amount.
+    """
+    products = {
+        product.product_id: product
+        for product in with_counters(Product.objects.filter(product_id__in=product_ids))
+    }
+    stock_before = sum(product.on_hand for product in products.values())
+    bills = Bill.objects.filter(customer_email__in=customer_emails)
+    bills_before = bills.count()
+
+    latencies = []
+    outcomes = Counter()
+    sold = Counter()
+    lock_samples = {kind: [] for kind in LOCK_KINDS}
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng, pick = basket_picker(product_ids, items, hot_products, hot_share, seed)
+        customer_email = customer_emails[seed % len(customer_emails)]
+        client = Client()
+        timer = LockTimer()
+        try:
+            with connection.execute_wrapper(timer):
+                for _ in range(checkouts):
+                    lines = pick()
+                    _, totals = price_basket(
+                        (products[pid].price, qty, products[pid].tax_percentage) for pid, qty in lines
+                    )
+                    amount_paid, tendered = totals['rounded_net_price'], None
+                    if rng.random() < cash_share:
+                        notes = math.ceil(amount_paid / 500) or 1
+                        amount_paid, tendered = notes * 500, {'500': notes}
+
+                    start = time.perf_counter()
+                    try:
+                        # A fresh Idempotency-Key per checkout, as the checkout page sends
+                        response = post_bill(
+                            client, customer_email, lines, str(amount_paid), tendered, uuid.uuid4().hex
+                        )
+                        outcome = 'ok' if response.status_code == 200 else response.json().get('error', 'error')
+                    except Exception as e:
+                        outcome = str(e)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+                        outcomes[outcome] += 1
+                        if outcome == 'ok':
+                            sold.update(dict(lines))
+        finally:
+            with lock:
+                for kind, samples in timer.samples.items():
+                    lock_samples[kind].extend(samples)
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    stock_after = sum(
+        product.on_hand for product in with_counters(Product.objects.filter(product_id__in=product_ids))
+    )
+    bills_after = bills.count()
+    succeeded = outcomes.pop('ok', 0)
+    return {
+        'checkouts': succeeded + sum(outcomes.values()),
+        'succeeded': succeeded,
+        'wall_seconds': round(wall, 3),
+        'throughput_per_second': round(succeeded / wall, 1) if wall else 0.0,
+        'latency_ms': latency_summary(latencies),
+        # generate_bill runs in one transaction, so a failed checkout should leave
+        # nothing behind; bills_consistent checks that it did
+        'rollbacks': {'total': sum(outcomes.values()), 'by_reason': dict(outcomes.most_common())},
+        'locks': {
+            kind: {
+                'statements': len(samples),
+                'total_ms': round(sum(samples), 1),
+                **latency_summary(samples),
+                'waits': sum(1 for sample in samples if sample > lock_wait_ms),
+            }
+            for kind, samples in lock_samples.items()
+        },
+        'stock_consistent': stock_before - stock_after == sum(sold.values()),
+        'bills_consistent': bills_after - bills_before == succeeded,
+    }
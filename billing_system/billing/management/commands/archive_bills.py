@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.archive import archive_after_days, archive_bills
+from billing.export import parse_export_date
+from billing.reports import day_bounds
+
+
+class Command(BaseCommand):
+    help = 'Move bills older than the archive horizon into the archive, one short transaction per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Archive bills older than this many days (default: BILL_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--before',
+                            help='Archive bills created before this day, YYYY-MM-DD (overrides --days)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Bills moved per transaction (default: 500)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to wait between batches, to leave room for checkouts (default: 0)')
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_export_date(options['before'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        if before is None:
+            days = options['days'] if options['days'] is not None else archive_after_days()
+            if days < 1:
+                raise CommandError('--days must be positive')
+            before = timezone.localdate() - timedelta(days=days)
+        # Whole days only, so a day's sales are either all live or all archived
+        cutoff = day_bounds(before)[0]
+
+        total = 0
+        for archived, newest in archive_bills(cutoff, options['batch_size']):
+            total += archived
+            self.stdout.write(f'Archived {archived} bills up to {timezone.localtime(newest):%Y-%m-%d %H:%M}')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} bills created before {before}'))
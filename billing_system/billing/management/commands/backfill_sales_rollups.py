@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.export import parse_export_date
+from billing.reports import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollup from bill history, a few days per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild, YYYY-MM-DD (default: first bill)')
+        parser.add_argument('--end', help='Last day to rebuild, YYYY-MM-DD (default: last bill)')
+        parser.add_argument('--chunk-days', type=int, default=7,
+                            help='Days rebuilt per transaction (default: 7)')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_export_date(options['start'])
+            end = parse_export_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        total = 0
+        for first_day, last_day, written in backfill_rollups(start, end, options['chunk_days']):
+            total += written
+            self.stdout.write(f'{first_day} to {last_day}: {written} rollup rows')
+        self.stdout.write(self.style.SUCCESS(f'Backfill complete: {total} rollup rows'))
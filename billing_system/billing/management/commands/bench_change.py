@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.bench import timed, summarise
+from billing.change import (
+    OptimalChangeEngine, bounded_change, greedy_change, normalise_inventory, _optimal_change
+)
+
+
+def parse_inventory(spec):
+    """Parse 'value:count,value:count' into an inventory tuple"""
+    try:
+        pairs = [tuple(int(part) for part in item.split(':')) for item in spec.split(',')]
+    except ValueError:
+        raise CommandError(f'Invalid inventory: {spec}')
+    return tuple(sorted(pairs, reverse=True))
+
+
+class Command(BaseCommand):
+    help = 'Compare greedy and bounded-inventory change making across a range of balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-balance', type=int, default=100000,
+                            help='Largest balance to try (default: 100000)')
+        parser.add_argument('--step', type=int, default=997,
+                            help='Distance between sampled balances (default: 997)')
+        parser.add_argument('--inventory', default='500:250,50:5,20:5,10:5,5:1,2:5,1:0',
+                            help='Shop notes as value:count pairs')
+
+    def handle(self, *args, **options):
+        inventory = parse_inventory(options['inventory'])
+        balances = list(range(1, options['max_balance'] + 1, options['step']))
+        engine = OptimalChangeEngine()
+        _optimal_change.cache_clear()
+
+        greedy_ms, dp_ms, engine_ms, cached_ms = [], [], [], []
+        greedy_refused = dp_refused = fewer_notes = 0
+
+        for balance in balances:
+            (greedy, _), elapsed = timed(greedy_change, balance, inventory)
+            greedy_ms.append(elapsed)
+            optimal, elapsed = timed(bounded_change, balance, normalise_inventory(balance, inventory))
+            dp_ms.append(elapsed)
+            _, elapsed = timed(engine.make_change, balance, inventory)
+            engine_ms.append(elapsed)
+            _, elapsed = timed(engine.make_change, balance, inventory)
+            cached_ms.append(elapsed)
+
+            if greedy is None:
+                greedy_refused += 1
+            if optimal is None:
+                dp_refused += 1
+            elif greedy is not None and (
+                sum(d['count'] for d in optimal) < sum(d['count'] for d in greedy)
+            ):
+                fewer_notes += 1
+
+        self.stdout.write(f'Balances tried: {len(balances)} (1..{options["max_balance"]}, step {options["step"]})')
+        self.stdout.write(f'Refused by greedy: {greedy_refused}, refused by DP: {dp_refused}')
+        self.stdout.write(f'DP used fewer notes than greedy: {fewer_notes}')
+        for label, samples in [
+            ('greedy', greedy_ms), ('bounded DP', dp_ms),
+            ('engine (cold)', engine_ms), ('engine (cached)', cached_ms),
+        ]:
+            stats = summarise(samples)
+            self.stdout.write(
+                f"{label:>16}: median {stats['median_ms']} ms, p95 {stats['p95_ms']} ms, "
+                f"total {round(sum(samples), 1)} ms"
+            )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from billing.bench import (
+    scratch_data, seed_products, seed_denominations, exact_payment, post_bill, timed, summarise
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure generate_bill query count and latency per basket size (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,30,60',
+                            help='Comma separated basket sizes (default: 1,5,10,30,60)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Checkouts per basket size (default: 5)')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        client = Client()
+        query_counts = {}
+
+        with scratch_data():
+            product_ids = seed_products(max(sizes))
+            seed_denominations()
+
+            self.stdout.write(f"{'basket':>8} {'queries':>8} {'median ms':>10} {'p95 ms':>10}")
+            for size in sizes:
+                # Pay the exact amount so change-making does not vary between sizes
+                lines = [(product_id, 1) for product_id in product_ids[:size]]
+                amount_paid = exact_payment(lines)
+                samples = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as ctx:
+                        response, elapsed = timed(post_bill, client, 'bench@example.com', lines, amount_paid)
+                    if response.status_code != 200:
+                        raise CommandError(f'Checkout failed: {response.content.decode()}')
+                    samples.append(elapsed)
+                    query_counts[size] = len(ctx.captured_queries)
+
+                stats = summarise(samples)
+                self.stdout.write(
+                    f"{size:>8} {query_counts[size]:>8} {stats['median_ms']:>10} {stats['p95_ms']:>10}"
+                )
+
+        if len(set(query_counts.values())) > 1:
+            raise CommandError(f'Query count varies with basket size: {query_counts}')
+        self.stdout.write(self.style.SUCCESS('Query count is constant across basket sizes'))
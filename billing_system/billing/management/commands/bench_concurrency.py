@@ -0,0 +1,107 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from billing.bench import committed_data, seed_products, seed_denominations
+from billing.loadtest import database_profile, run_checkout_load
+
+PREFIX = 'CONC'
+EMAIL = 'bench-concurrency@example.com'
+
+# Pragmas SQLite uses when none are set, for comparison with settings.SQLITE_PRAGMAS
+SQLITE_DEFAULTS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000, 'mmap_size': 0}
+
+
+class Command(BaseCommand):
+    help = 'Load-test generate_bill with N parallel checkout workers and report throughput and contention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel checkout threads (default: 8)')
+        parser.add_argument('--checkouts', type=int, default=25,
+                            help='Checkouts per worker (default: 25)')
+        parser.add_argument('--items', type=int, default=5,
+                            help='Products per basket (default: 5)')
+        parser.add_argument('--products', type=int, default=50,
+                            help='Products to choose baskets from (default: 50)')
+        parser.add_argument('--hot-products', type=int, default=5,
+                            help='Size of the hot product set (default: 5)')
+        parser.add_argument('--hot-share', type=float, default=0.0,
+                            help='Chance that a basket line is a hot product, 0..1 (default: 0, uniform)')
+        parser.add_argument('--cash-share', type=float, default=0.0,
+                            help='Share of checkouts paid in 500 notes that need change, 0..1 (default: 0)')
+        parser.add_argument('--lock-wait-ms', type=float, default=10.0,
+                            help='Locking statements slower than this count as waits (default: 10)')
+        parser.add_argument('--sqlite-pragmas', choices=['settings', 'default'], default='settings',
+                            help="SQLite only: use settings.SQLITE_PRAGMAS or SQLite's own defaults")
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['items'] > options['products']:
+            raise CommandError('--items cannot exceed --products')
+        if options['hot_products'] > options['products']:
+            raise CommandError('--hot-products cannot exceed --products')
+        for name in ('hot_share', 'cash_share'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1")
+
+        pragmas = settings.SQLITE_PRAGMAS if options['sqlite_pragmas'] == 'settings' else SQLITE_DEFAULTS
+        # Workers open their own connections, which pick up the pragmas
+        connections.close_all()
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            try:
+                results = self.run(options)
+            finally:
+                connections.close_all()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, options):
+        config = {
+            name: options[name] for name in (
+                'workers', 'checkouts', 'items', 'products', 'hot_products',
+                'hot_share', 'cash_share', 'lock_wait_ms', 'sqlite_pragmas',
+            )
+        }
+        with committed_data(PREFIX, [EMAIL]):
+            product_ids = seed_products(options['products'], prefix=PREFIX)
+            if options['cash_share']:
+                seed_denominations()
+            profile = database_profile()
+            results = run_checkout_load(
+                product_ids, [EMAIL],
+                **{name: options[name] for name in (
+                    'workers', 'checkouts', 'items', 'hot_products', 'hot_share', 'cash_share', 'lock_wait_ms',
+                )}
+            )
+        return {'run_at': timezone.now().isoformat(), 'config': config, 'database': profile, **results}
+
+    def report(self, results):
+        self.stdout.write('Database: ' + ', '.join(f'{name}={value}' for name, value in results['database'].items()))
+        self.stdout.write(
+            f"Checkouts: {results['checkouts']}, succeeded: {results['succeeded']}, "
+            f"wall time {results['wall_seconds']} s, {results['throughput_per_second']} bills/s"
+        )
+        latency = results['latency_ms']
+        self.stdout.write(
+            f"Latency: p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms"
+        )
+        for kind, stats in results['locks'].items():
+            self.stdout.write(
+                f"{kind:>18}: {stats['statements']} statements, {stats['total_ms']} ms total, "
+                f"p95 {stats['p95']} ms, {stats['waits']} waits"
+            )
+        rollbacks = results['rollbacks']
+        self.stdout.write(f"Rollbacks: {rollbacks['total']}")
+        for reason, count in list(rollbacks['by_reason'].items())[:5]:
+            self.stdout.write(f'  {count} x {reason}')
+        self.stdout.write(f"Stock consistent with successful bills: {'yes' if results['stock_consistent'] else 'NO'}")
+        self.stdout.write(f"One bill per successful checkout: {'yes' if results['bills_consistent'] else 'NO'}")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from billing.bench import scratch_data, seed_bills, timed, summarise
+from billing.models import Bill
+from billing.pagination import encode_cursor
+
+
+class Command(BaseCommand):
+    help = 'Compare keyset-paginated listing latency at page 1 and a deep page (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=20,
+                            help='Bills per page (default: 20)')
+        parser.add_argument('--page', type=int, default=10000,
+                            help='Deep page to compare with page 1 (default: 10000)')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Requests per measurement (default: 10)')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        deep_page = options['page']
+        email = 'bench@example.com'
+        client = Client()
+
+        with scratch_data(), override_settings(BILLS_PAGE_SIZE=page_size):
+            self.stdout.write(f'Seeding {deep_page * page_size} bills...')
+            seed_bills(deep_page * page_size, emails=(email,))
+
+            # Cursor for the deep page is the last bill of the page before it
+            ordered = Bill.objects.order_by('-created_at', '-id')
+            deep_cursor = encode_cursor(ordered[(deep_page - 1) * page_size - 1])
+
+            routes = [
+                ('bills_list', '/bills/', {}),
+                ('customer_purchases', '/customer-purchases/', {'email': email}),
+            ]
+            for name, url, params in routes:
+                for label, extra in [('page 1', {}), (f'page {deep_page}', {'cursor': deep_cursor})]:
+                    samples = []
+                    for _ in range(options['repeat']):
+                        _, elapsed = timed(client.get, url, {**params, **extra})
+                        samples.append(elapsed)
+                    stats = summarise(samples)
+                    self.stdout.write(
+                        f"{name:>20} keyset {label:>11}: median {stats['median_ms']} ms, p95 {stats['p95_ms']} ms"
+                    )
+
+            # OFFSET pagination for comparison
+            for label, offset in [('page 1', 0), (f'page {deep_page}', (deep_page - 1) * page_size)]:
+                samples = []
+                for _ in range(options['repeat']):
+                    _, elapsed = timed(lambda: list(ordered[offset:offset + page_size]))
+                    samples.append(elapsed)
+                stats = summarise(samples)
+                self.stdout.write(
+                    f"{'bills query':>20} offset {label:>11}: median {stats['median_ms']} ms, p95 {stats['p95_ms']} ms"
+                )
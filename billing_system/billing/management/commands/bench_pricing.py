@@ -0,0 +1,89 @@
+import math
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from billing.bench import timed
+from billing.pricing import from_micro, price_basket, price_baskets, to_paise
+
+TAX_RATES = [Decimal('0'), Decimal('5'), Decimal('12'), Decimal('18'), Decimal('28'), Decimal('12.5')]
+
+
+def decimal_loop(lines):
+    """The per-line Decimal loop generate_bill used before the pricing kernel"""
+    priced = []
+    total_price_without_tax = Decimal('0')
+    total_tax = Decimal('0')
+    for unit_price, quantity, tax_percentage in lines:
+        item_total_without_tax = unit_price * quantity
+        tax_amount = (item_total_without_tax * tax_percentage) / Decimal('100')
+        priced.append({
+            'unit_price': unit_price,
+            'quantity': quantity,
+            'tax_percentage': tax_percentage,
+            'tax_amount': tax_amount,
+            'total_price': item_total_without_tax + tax_amount,
+        })
+        total_price_without_tax += item_total_without_tax
+        total_tax += tax_amount
+    net_price = total_price_without_tax + total_tax
+    return Decimal(str(math.ceil(float(net_price))))
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-line Decimal loop with the integer pricing kernel, per basket and batched'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baskets', type=int, default=5000,
+                            help='Baskets to price (default: 5000)')
+        parser.add_argument('--lines', type=int, default=20,
+                            help='Lines per basket (default: 20)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        baskets = [
+            [
+                (Decimal(rng.randint(1, 500000)).scaleb(-2), rng.randint(1, 50), rng.choice(TAX_RATES))
+                for _ in range(options['lines'])
+            ]
+            for _ in range(options['baskets'])
+        ]
+
+        legacy, legacy_ms = timed(lambda: [decimal_loop(lines) for lines in baskets])
+        per_basket, per_basket_ms = timed(
+            lambda: [price_basket(lines)[1]['rounded_net_price'] for lines in baskets]
+        )
+
+        def flatten():
+            unit_prices, quantities, tax_rates, offsets = [], [], [], [0]
+            for lines in baskets:
+                for price, quantity, rate in lines:
+                    unit_prices.append(to_paise(price))
+                    quantities.append(quantity)
+                    tax_rates.append(to_paise(rate))
+                offsets.append(len(unit_prices))
+            return unit_prices, quantities, tax_rates, offsets
+
+        arrays, flatten_ms = timed(flatten)
+        batched, batched_ms = timed(price_baskets, *arrays)
+        batched = [from_micro(totals['rounded_net_price']) for totals in batched]
+
+        mismatches = sum(1 for old, new in zip(legacy, per_basket) if old != new)
+        inconsistent = sum(1 for single, batch in zip(per_basket, batched) if single != batch)
+
+        count = options['baskets']
+        self.stdout.write(f"Baskets: {count} x {options['lines']} lines")
+        for label, elapsed in [
+            ('Decimal loop', legacy_ms),
+            ('price_basket', per_basket_ms),
+            ('price_baskets', batched_ms),
+            ('  + flattening', batched_ms + flatten_ms),
+        ]:
+            self.stdout.write(
+                f'{label:>16}: total {round(elapsed, 1)} ms, '
+                f'{round(elapsed * 1000 / count, 2)} us per basket'
+            )
+        self.stdout.write(f'Rounded totals differing from the Decimal loop: {mismatches}')
+        self.stdout.write(f'Batched totals differing from price_basket: {inconsistent}')
@@ -0,0 +1,49 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from billing.bench import scratch_data, seed_products, timed, summarise
+
+
+class Command(BaseCommand):
+    help = 'Compare per-product lookups with the batch lookup API for one basket (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--basket', type=int, default=40,
+                            help='Products per basket (default: 40)')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Baskets per measurement (default: 20)')
+
+    def lookup_each(self, client, product_ids):
+        for product_id in product_ids:
+            client.get(f'/api/product/{product_id}/')
+
+    def lookup_batch(self, client, product_ids):
+        client.post('/api/products/batch/', data=json.dumps({'product_ids': product_ids}),
+                    content_type='application/json')
+
+    def handle(self, *args, **options):
+        client = Client()
+        with scratch_data():
+            product_ids = seed_products(options['basket'])
+
+            for label, lookup in [('one request per product', self.lookup_each),
+                                  ('batch request', self.lookup_batch)]:
+                for cache_state in ('cold', 'warm'):
+                    samples = []
+                    for _ in range(options['repeat']):
+                        if cache_state == 'cold':
+                            cache.clear()
+                        with CaptureQueriesContext(connection) as ctx:
+                            _, elapsed = timed(lookup, client, product_ids)
+                        samples.append(elapsed)
+
+                    stats = summarise(samples)
+                    self.stdout.write(
+                        f"{label:>24} ({cache_state}): {len(ctx.captured_queries):>3} queries, "
+                        f"median {stats['median_ms']} ms, p95 {stats['p95_ms']} ms per basket"
+                    )
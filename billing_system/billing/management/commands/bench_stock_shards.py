@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from billing.bench import committed_data, seed_products
+from billing.loadtest import database_profile, run_checkout_load
+from billing.stock import shard_stock
+
+PREFIX = 'SHARD'
+
+
+class Command(BaseCommand):
+    help = 'Compare checkout throughput on one hot product with its stock in one row and split across counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel checkout threads, each billing its own customer (default: 8)')
+        parser.add_argument('--checkouts', type=int, default=25,
+                            help='Checkouts per worker and run (default: 25)')
+        parser.add_argument('--shards', type=int, default=8,
+                            help='Stock counters for the sharded run (default: 8)')
+        parser.add_argument('--lock-wait-ms', type=float, default=10.0,
+                            help='Locking statements slower than this count as waits (default: 10)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['checkouts'] < 1:
+            raise CommandError('--workers and --checkouts must be positive')
+        if options['shards'] < 1:
+            raise CommandError('--shards must be positive')
+        if connection.vendor == 'sqlite':
+            self.stderr.write(
+                'SQLite lets one transaction write at a time, so sharding cannot raise throughput here; '
+                'run against PostgreSQL to measure row-lock contention.'
+            )
+
+        emails = [f'bench-shards-{n}@example.com' for n in range(options['workers'])]
+        # Workers open their own connections
+        connections.close_all()
+        try:
+            with committed_data(PREFIX, emails):
+                product_ids = seed_products(1, prefix=PREFIX)
+                runs = {}
+                for label, shards in (('one row', 0), (f"{options['shards']} counters", options['shards'])):
+                    shard_stock(product_ids[0], shards)
+                    runs[label] = run_checkout_load(
+                        product_ids, emails, workers=options['workers'], checkouts=options['checkouts'],
+                        items=1, hot_products=1, hot_share=1.0, lock_wait_ms=options['lock_wait_ms'],
+                    )
+                results = {
+                    'run_at': timezone.now().isoformat(),
+                    'config': {name: options[name] for name in ('workers', 'checkouts', 'shards', 'lock_wait_ms')},
+                    'database': database_profile(),
+                    'runs': runs,
+                }
+        finally:
+            connections.close_all()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def report(self, results):
+        self.stdout.write('Database: ' + ', '.join(f'{name}={value}' for name, value in results['database'].items()))
+        self.stdout.write(
+            f"{'stock':>12} {'bills/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'lock waits':>10} {'rollbacks':>9} consistent"
+        )
+        for label, run in results['runs'].items():
+            waits = sum(stats['waits'] for stats in run['locks'].values())
+            self.stdout.write(
+                f"{label:>12} {run['throughput_per_second']:>8} {run['latency_ms']['p50']:>8} "
+                f"{run['latency_ms']['p95']:>8} {waits:>10} {run['rollbacks']['total']:>9} "
+                f"{'yes' if run['stock_consistent'] and run['bills_consistent'] else 'NO'}"
+            )
+        baseline, sharded = results['runs'].values()
+        if baseline['throughput_per_second']:
+            speedup = sharded['throughput_per_second'] / baseline['throughput_per_second']
+            self.stdout.write(f'Sharded throughput: {speedup:.2f}x')
@@ -0,0 +1,216 @@
+import json
+import math
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from billing import urls as billing_urls
+from billing.archive import archive_bills
+from billing.bench import (
+    scratch_data, seed_products, seed_denominations, seed_bills, seed_bill_lines, exact_payment
+)
+from billing.middleware import QueryCounter
+from billing.models import Bill, BillItem, Product, UserProfile
+from billing.reports import backfill_rollups
+from billing.invoices import reprint_invoices
+from billing.summaries import rebuild_summaries
+
+EMAIL = 'bench@example.com'
+
+# Route name -> (method, path, payload, maximum queries).
+# Every route in billing/urls.py must have an entry; budgets must not grow with data volume.
+BUDGETS = {
+    'index': ('get', '/', None, 1),
+    # Exact payment by a known customer, with the Idempotency-Key lookup and its savepoint
+    'generate_bill': ('post', '/generate-bill/', 'checkout', 17),
+    # The stored invoice, also looked up for a 304; cached invoices run none
+    'bill_detail': ('get', '/bill/{bill_id}/', None, 1),
+    # Live and archived pages, the summary and its product names
+    'customer_purchases': ('get', f'/customer-purchases/?email={EMAIL}', None, 4),
+    # Count and page on a cache miss; cached pages run none
+    'products_list': ('get', '/products/', None, 2),
+    'bills_list': ('get', '/bills/', None, 1),
+    # Streamed: bills, items with products, balance denominations per 2000-bill chunk,
+    # and archived bills per chunk
+    'export_bills': ('get', f'/bills/export/?email={EMAIL}', None, 4),
+    # One chunk of replayed sales, however many bills it holds
+    'import_bills': ('post', '/bills/import/', 'import', 17),
+    'users_list': ('get', '/users/', None, 1),
+    'user_detail': ('get', '/user/{user_id}/', None, 5),
+    'user_profile_form': ('get', '/user-profile/', None, 0),
+    'get_product_info': ('get', '/api/product/{product_id}/', None, 1),
+    'get_products_batch': ('post', '/api/products/batch/', 'batch', 1),
+    'quote': ('post', '/api/quote/', 'checkout', 1),
+    'metrics': ('get', '/metrics', None, 0),
+    'sales_report': ('get', '/api/reports/sales/?group=day_product', None, 2),
+}
+
+# Further requests to a route that take a costlier path, each with its own
+# budget: label -> (route, payload, maximum queries). settings.QUERY_BUDGET
+# must cover the dearest of them all.
+VARIANTS = {
+    # Notes tendered and change handed back
+    'generate_bill change': ('generate_bill', 'change', 19),
+    # First bill of a customer paying cash: the summary row is created too
+    'generate_bill new customer': ('generate_bill', 'new customer', 21),
+}
+
+# Admin page -> (path, maximum queries), for a logged-in superuser. Each
+# includes the session and user lookups; changelists over big tables count
+# rows from table statistics, and the bill list adds the date drill-down.
+ADMIN_BUDGETS = {
+    'bill changelist': ('/admin/billing/bill/', 7),
+    'bill by month': ('/admin/billing/bill/?created_at__year={year}&created_at__month={month}', 5),
+    'bill search': ('/admin/billing/bill/?q=bench', 6),
+    'bill change': ('/admin/billing/bill/{bill_id}/change/', 8),
+    'billitem changelist': ('/admin/billing/billitem/', 5),
+    'billitem search': ('/admin/billing/billitem/?q={product_id}', 4),
+    'billitem change': ('/admin/billing/billitem/{item_id}/change/', 8),
+    'product changelist': ('/admin/billing/product/', 6),
+    'product search': ('/admin/billing/product/?q=bench+product+1', 5),
+    'product change': ('/admin/billing/product/{product_pk}/change/', 6),
+}
+
+
+class Command(BaseCommand):
+    help = 'Fail if any billing route runs more queries than its budget on a realistic data set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bills', type=int, default=2000,
+                            help='Bills to seed (default: 2000)')
+        parser.add_argument('--items', type=int, default=24,
+                            help='Items per seeded bill (default: 24)')
+        parser.add_argument('--products', type=int, default=500,
+                            help='Products to seed (default: 500)')
+
+    def handle(self, *args, **options):
+        route_names = {pattern.name for pattern in billing_urls.urlpatterns}
+        unbudgeted = route_names - set(BUDGETS)
+        if unbudgeted:
+            raise CommandError(f'No query budget for: {", ".join(sorted(unbudgeted))}')
+        dearest = max(budget for *_, budget in [*BUDGETS.values(), *VARIANTS.values()])
+        query_budget = getattr(settings, 'QUERY_BUDGET', 24)
+        if dearest > query_budget:
+            raise CommandError(f'QUERY_BUDGET ({query_budget}) is below the dearest route budget ({dearest})')
+
+        client = Client()
+        failures = []
+        with scratch_data():
+            product_ids = seed_products(options['products'])
+            seed_denominations()
+            seed_bills(options['bills'], emails=(EMAIL, 'other@example.com'))
+            seed_bill_lines(options['items'])
+            rebuild_summaries()
+            for _ in backfill_rollups():
+                pass
+            user = User.objects.create(username='bench', email=EMAIL)
+            UserProfile.objects.create(user=user)
+
+            basket = [(product_id, 1) for product_id in product_ids[:options['items']]]
+            # Enough 500 notes to cover the basket and then some, so there is change to give
+            notes = math.ceil(exact_payment(basket) / 500) + 1
+            cash = {
+                'customer_email': EMAIL,
+                'bill_items': [{'product_id': pid, 'quantity': qty} for pid, qty in basket],
+                'denomination_counts': {'500': notes},
+                'amount_paid': notes * 500,
+            }
+            payloads = {
+                'checkout': {
+                    'customer_email': EMAIL,
+                    'bill_items': [{'product_id': pid, 'quantity': qty} for pid, qty in basket],
+                    'denomination_counts': {},
+                    'amount_paid': exact_payment(basket),
+                },
+                'change': cash,
+                # Also products not sold yet today, so rollup rows are both updated and created
+                'new customer': {
+                    **cash,
+                    'customer_email': 'new-customer@example.com',
+                    'bill_items': cash['bill_items'] + [
+                        {'product_id': pid, 'quantity': 1} for pid in product_ids[len(basket):len(basket) + 3]
+                    ],
+                    'amount_paid': (notes + 1) * 500,
+                    'denomination_counts': {'500': notes + 1},
+                },
+                'batch': {'product_ids': product_ids[:40]},
+                'import': '\n'.join(
+                    json.dumps({
+                        'idempotency_key': f'budget-{number}',
+                        'customer_email': EMAIL,
+                        'bill_items': [{'product_id': pid, 'quantity': qty} for pid, qty in basket[:3]],
+                        'amount_paid': exact_payment(basket[:3]),
+                    })
+                    for number in range(10)
+                ),
+            }
+            # Archive the older half, so purchase history reads both tables
+            middle = Bill.objects.order_by('created_at', 'id')[options['bills'] // 2]
+            for _ in archive_bills(middle.created_at):
+                pass
+            bill_id = Bill.objects.filter(customer_email=EMAIL).latest('created_at').id
+            # Seeded bills have no snapshot or invoice; generate_bill stores both with every bill
+            list(reprint_invoices(Bill.objects.filter(customer_email=EMAIL)))
+            context = {
+                'bill_id': bill_id,
+                'user_id': user.id,
+                'product_id': product_ids[0],
+            }
+
+            bill = Bill.objects.get(pk=bill_id)
+            admin_context = {
+                'bill_id': bill_id,
+                'item_id': BillItem.objects.filter(bill_id=bill_id).values_list('id', flat=True).first(),
+                'product_id': product_ids[0],
+                'product_pk': Product.objects.get(product_id=product_ids[0]).pk,
+                'year': bill.created_at.year,
+                'month': bill.created_at.month,
+            }
+
+            cases = [(name, *BUDGETS[name]) for name in sorted(route_names)]
+            for label, (route, payload, budget) in VARIANTS.items():
+                method, path, *_ = BUDGETS[route]
+                cases.append((label, method, path, payload, budget))
+
+            self.stdout.write(f"{'route':>26} {'queries':>8} {'budget':>7}")
+            for name, method, path, payload, budget in cases:
+                path = path.format(**context)
+                # A fresh key on every POST, as the checkout page sends with each bill
+                headers = {'Idempotency-Key': uuid.uuid4().hex}
+                with QueryCounter() as counter:
+                    if method == 'post' and isinstance(payloads[payload], str):
+                        response = client.post(path, data=payloads[payload],
+                                               content_type='application/x-ndjson', headers=headers)
+                    elif method == 'post':
+                        response = client.post(path, data=json.dumps(payloads[payload]),
+                                               content_type='application/json', headers=headers)
+                    else:
+                        response = client.get(path)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                if response.status_code >= 400:
+                    failures.append(f'{name}: HTTP {response.status_code}')
+
+                flag = '' if counter.count <= budget else '  OVER BUDGET'
+                if flag:
+                    failures.append(f'{name}: {counter.count} queries (budget {budget})')
+                self.stdout.write(f'{name:>26} {counter.count:>8} {budget:>7}{flag}')
+
+            client.force_login(User.objects.create_superuser('budget-admin', 'budget-admin@example.com', None))
+            for name, (path, budget) in ADMIN_BUDGETS.items():
+                with QueryCounter() as counter:
+                    response = client.get(path.format(**admin_context))
+                if response.status_code >= 400:
+                    failures.append(f'{name}: HTTP {response.status_code}')
+
+                flag = '' if counter.count <= budget else '  OVER BUDGET'
+                if flag:
+                    failures.append(f'{name}: {counter.count} queries (budget {budget})')
+                self.stdout.write(f'{name:>26} {counter.count:>8} {budget:>7}{flag}')
+
+        if failures:
+            raise CommandError('Query budget check failed:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All routes within their query budgets'))
@@ -0,0 +1,181 @@
+import re
+from datetime import timedelta
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from billing.archive import archivable_bills, archive_bills
+from billing.bench import scratch_data, seed_products, seed_bills, seed_bill_lines
+from billing.catalogue import search_products
+from billing.emails import queue_invoice_emails
+from billing.models import (
+    ArchivedBill, Bill, BillItem, CustomerSummary, DailySalesRollup, InvoiceDocument, InvoiceEmail, Product, StockShard,
+)
+from billing.reports import backfill_rollups
+from billing.stock import shard_stock, with_counters
+from billing.summaries import rebuild_summaries
+
+EMAIL = 'bench@example.com'
+
+
+def view_queries(context):
+    """
+    Name -> (main query of a view or job, whether its ORDER BY must come from
+    the index). Ordered queries feed LIMITed pages, so sorting the matching
+    rows instead would grow with the data.
+    """
+    today = timezone.localdate()
+    recent = timezone.now() - timedelta(days=7)
+
+    def admin_search(model, term):
+        model_admin = admin.site._registry[model]
+        return model_admin.get_search_results(None, model.objects.all(), term)[0]
+
+    return {
+        'bills_list': (Bill.objects.order_by('-created_at', '-id')[:51], True),
+        'bills_list (cursor)': (
+            Bill.objects.order_by('-created_at', '-id')
+            .filter(created_at__lte=context['created_at'])
+            .exclude(created_at=context['created_at'], id__gte=context['bill_id'])[:51],
+            True,
+        ),
+        'customer_purchases': (Bill.objects.filter(customer_email=EMAIL).order_by('-created_at', '-id')[:51], True),
+        'archived purchases': (
+            ArchivedBill.objects.filter(customer_email=EMAIL).order_by('-created_at', '-id')[:51], True
+        ),
+        'customer_summary': (CustomerSummary.objects.filter(customer_email=EMAIL), False),
+        'bill_detail': (InvoiceDocument.objects.filter(bill_id=context['bill_id']), False),
+        'bill snapshot': (Bill.objects.filter(pk=context['bill_id']), False),
+        'bill snapshot items': (BillItem.objects.filter(bill_id=context['bill_id']), False),
+        'archived bill_detail': (ArchivedBill.objects.filter(pk=context['archived_id']), False),
+        'generate_bill replay': (Bill.objects.filter(idempotency_key='plan-check'), False),
+        'archived replay': (ArchivedBill.objects.filter(idempotency_key='plan-check'), False),
+        'export_bills': (
+            Bill.objects.filter(created_at__gte=recent).order_by('created_at', 'id'), True
+        ),
+        'export_bills (email)': (
+            Bill.objects.filter(customer_email=EMAIL, created_at__gte=recent).order_by('created_at', 'id'), True
+        ),
+        'export archived': (
+            ArchivedBill.objects.filter(created_at__gte=recent - timedelta(days=365)).order_by('created_at', 'id'),
+            True,
+        ),
+        'export archived (email)': (
+            ArchivedBill.objects.filter(customer_email=EMAIL).order_by('created_at', 'id'), True
+        ),
+        'products_list': (with_counters(Product.objects.order_by('name', 'id'))[:100], True),
+        # Few rows match a search; they are sorted after both index seeks
+        'products_list search': (
+            search_products(with_counters(Product.objects.order_by('name', 'id')), 'Bench product 1')[:100],
+            False,
+        ),
+        'get_products_batch': (Product.objects.filter(product_id__in=context['product_ids']), False),
+        'product_sales': (
+            BillItem.objects.filter(product__product_id=context['product_ids'][0], bill__created_at__gte=recent)
+            .values('bill_id', 'quantity'),
+            False,
+        ),
+        'stock counter take': (
+            StockShard.objects.filter(product__product_id=context['product_ids'][0], shard=0, count__gte=1), False
+        ),
+        'sales_report': (
+            DailySalesRollup.objects.filter(day__gte=today - timedelta(days=7), day__lte=today)
+            .values('day').order_by('day'),
+            False,
+        ),
+        'admin bill search': (admin_search(Bill, 'bench@'), False),
+        'admin billitem search': (admin_search(BillItem, context['product_ids'][0]), False),
+        'admin product search': (admin_search(Product, 'bench product 1'), False),
+        'archive_bills': (archivable_bills(context['created_at'])[:500], True),
+        'send_invoice_emails': (
+            InvoiceEmail.objects.filter(status=InvoiceEmail.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:100],
+            True,
+        ),
+    }
+
+
+def plan_problems(vendor, plan, ordered):
+    """
+    What in an EXPLAIN plan shows the query not being served by an index.
+    Walking a whole index is only fine for ordered queries, which read it in
+    order and stop at their LIMIT.
+    """
+    problems = []
+    if vendor == 'sqlite':
+        for line in plan.splitlines():
+            scan = re.search(r'\bSCAN (\w+)', line)
+            if scan and not (ordered and 'USING' in line):
+                problems.append(f'full scan of {scan.group(1)}')
+        if ordered and 'USE TEMP B-TREE FOR ORDER BY' in plan:
+            problems.append('sorts instead of reading in index order')
+    else:
+        for table in re.findall(r'Seq Scan on (\w+)', plan):
+            problems.append(f'full scan of {table}')
+        if not ordered and 'Index Cond' not in plan:
+            problems.append('walks a whole index')
+        if ordered and re.search(r'(^|->\s+)Sort\b', plan, re.MULTILINE):
+            problems.append('sorts instead of reading in index order')
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Fail if any view's main query is planned without an index, using EXPLAIN on a seeded data set"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bills', type=int, default=2000,
+                            help='Bills to seed (default: 2000)')
+        parser.add_argument('--items', type=int, default=5,
+                            help='Items per seeded bill (default: 5)')
+        parser.add_argument('--products', type=int, default=500,
+                            help='Products to seed (default: 500)')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Query plans cannot be checked on {connection.vendor}')
+
+        failures = []
+        with scratch_data():
+            product_ids = seed_products(options['products'])
+            seed_bills(options['bills'], emails=(EMAIL, 'other@example.com'))
+            seed_bill_lines(options['items'])
+            rebuild_summaries()
+            for _ in backfill_rollups():
+                pass
+            queue_invoice_emails([(bill, 'Plan check') for bill in Bill.objects.order_by('-id')[:50]])
+            middle = Bill.objects.order_by('created_at', 'id')[options['bills'] // 2]
+            for _ in archive_bills(middle.created_at):
+                pass
+            shard_stock(product_ids[0], 8)
+
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+                if connection.vendor == 'postgresql':
+                    # Small tables are cheaper to scan than to search; ask only
+                    # whether an index can serve the query
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            newest = Bill.objects.order_by('-created_at', '-id')[10]
+            context = {
+                'bill_id': newest.id,
+                'created_at': newest.created_at,
+                'archived_id': ArchivedBill.objects.order_by('-created_at').first().id,
+                'product_ids': product_ids[:40],
+            }
+
+            for name, (queryset, ordered) in view_queries(context).items():
+                plan = queryset.explain()
+                problems = plan_problems(connection.vendor, plan, ordered)
+                if problems:
+                    failures.append(f"{name}: {', '.join(problems)}")
+                status = self.style.ERROR('NO INDEX') if problems else 'ok'
+                self.stdout.write(f'{name:>24} {status}')
+                if options['verbosity'] > 1 or problems:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'{"":>26}{line}')
+
+        if failures:
+            raise CommandError('Query plan check failed:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Every main query is served by an index'))
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.export import EXPORT_FORMATS, archived_export_queryset, export_queryset, iter_export, parse_export_date
+
+
+class Command(BaseCommand):
+    help = 'Export bills, live and archived, with their items and balance denominations as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv',
+                            help='Output format (default: csv)')
+        parser.add_argument('--start', help='First day to export, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--end', help='Last day to export, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--email', help='Only export bills for this customer')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Bills fetched per database round trip (default: 2000)')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_export_date(options['start'])
+            end = parse_export_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        bills = export_queryset(start, end, options['email'])
+        archived = archived_export_queryset(start, end, options['email'])
+        lines = iter_export(options['format'], bills, chunk_size=options['chunk_size'], archived=archived)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,43 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.ingest import ingest_bills
+
+
+class Command(BaseCommand):
+    help = 'Bill sales queued by offline terminals from a JSONL file, one bill per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL file of bills, or '-' for stdin")
+        parser.add_argument('--chunk-size', type=int,
+                            default=getattr(settings, 'BILL_IMPORT_CHUNK_SIZE', 100),
+                            help='Bills committed per transaction (default: BILL_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--output', help='File to write per-bill outcomes as JSONL (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        try:
+            source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        try:
+            for result in ingest_bills(source, chunk_size=options['chunk_size']):
+                counts[result['status']] += 1
+                output.write(json.dumps(result) + '\n')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(
+            f"Created {counts['created']} bills, {counts['duplicate']} duplicates, {counts['error']} errors"
+        )
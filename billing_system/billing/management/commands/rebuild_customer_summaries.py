@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from billing.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute every customer purchase summary from bill history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Customers written per transaction (default: 500)')
+
+    def handle(self, *args, **options):
+        written = rebuild_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} customer summaries'))
@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.export import parse_export_date
+from billing.invoices import decompress, reprint_invoices
+from billing.models import Bill
+from billing.reports import day_bounds
+
+
+class Command(BaseCommand):
+    help = 'Render the stored invoices of bills in a date range again, in parallel, optionally writing them out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to reprint, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--end', help='Last day to reprint, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Rendering processes (default: one per CPU)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Bills read, rendered and stored per batch (default: 500)')
+        parser.add_argument('--output-dir',
+                            help='Also write each invoice to this directory as invoice-<bill id>.<format>')
+        parser.add_argument('--format', choices=['txt', 'html'], default='txt',
+                            help='Format written to --output-dir (default: txt)')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_export_date(options['start'])
+            end = parse_export_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive')
+
+        bills = Bill.objects.all()
+        if start:
+            bills = bills.filter(created_at__gte=day_bounds(start)[0])
+        if end:
+            bills = bills.filter(created_at__lt=day_bounds(end)[1])
+
+        output_dir = options['output_dir']
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        count = 0
+        began = time.perf_counter()
+        for bill_id, text, html in reprint_invoices(bills, options['workers'], options['chunk_size']):
+            count += 1
+            if output_dir:
+                body = text if options['format'] == 'txt' else html
+                path = os.path.join(output_dir, f"invoice-{bill_id}.{options['format']}")
+                with open(path, 'w', encoding='utf-8') as output:
+                    output.write(decompress(body))
+
+        elapsed = time.perf_counter() - began
+        self.stderr.write(f"Reprinted {count} invoices in {elapsed:.1f} s with {options['workers']} workers")
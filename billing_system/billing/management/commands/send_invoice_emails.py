@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from billing.emails import deliver_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued invoice emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Emails sent per connection (default: 100)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls in --loop mode (default: 5)')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_pending_emails(batch_size=options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, permanently failed {failed}')
+
+            # A full batch means more may be due right away
+            if sent + failed == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {total_sent} sent, {total_failed} permanently failed'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import Product
+from billing.stock import shard_stock
+
+
+class Command(BaseCommand):
+    help = "Split hot products' stock across counters that checkouts take from in parallel, or gather it back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', help='Product IDs to shard')
+        parser.add_argument('--shards', type=int, required=True,
+                            help='Counters per product; 0 gathers the stock back into the product. '
+                                 'Repeating the current count rebalances the counters')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError('--shards must be between 0 and 256')
+
+        for product_id in options['product_ids']:
+            try:
+                product = shard_stock(product_id, options['shards'])
+            except Product.DoesNotExist:
+                raise CommandError(f'Product {product_id} not found')
+            self.stdout.write(
+                f'{product.product_id}: {product.on_hand} units on {product.stock_shards or "no"} counters'
+            )
@@ -0,0 +1,84 @@
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .instrumentation import RequestMetrics, activate, deactivate, record_request
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Count the SQL statements run on every database connection inside a `with` block"""
+
+    def __init__(self):
+        self.count = 0
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+class QueryBudgetMiddleware:
+    """
+    Development aid: report each request's query count in an X-Query-Count
+    header and log a warning when it exceeds settings.QUERY_BUDGET.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+
+        budget = getattr(settings, 'QUERY_BUDGET', 24)
+        response['X-Query-Count'] = str(counter.count)
+        if counter.count > budget:
+            response['X-Query-Budget-Exceeded'] = f'{counter.count}>{budget}'
+            logger.warning(
+                'Query budget exceeded: %s %s ran %d queries (budget %d)',
+                request.method, request.path, counter.count, budget
+            )
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Time every request, its SQL and its named spans; add a Server-Timing
+    header and record the measurements for /metrics.
+    Streamed responses are timed until the view returns, not until the
+    last chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            deactivate(token)
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        record_request(view, request.method, response.status_code, total, metrics)
+        response['Server-Timing'] = metrics.server_timing(total)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_invoiceemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['-created_at', '-id'], name='billing_bil_created_af2ddd_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_bill_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_email', models.EmailField(max_length=254, unique=True)),
+                ('bill_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_purchase_at', models.DateTimeField(blank=True, null=True)),
+                ('product_quantities', models.JSONField(blank=True, default=dict, help_text='Units bought per product_id')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'customer summaries',
+                'ordering': ['customer_email'],
+            },
+        ),
+    ]
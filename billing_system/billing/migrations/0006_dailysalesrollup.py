@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_customersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tax_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('quantity', models.IntegerField(default=0)),
+                ('line_count', models.IntegerField(default=0)),
+                ('total_price_without_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_sales', to='billing.product')),
+            ],
+            options={
+                'ordering': ['day', 'product'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'tax_percentage'), name='unique_daily_sales_rollup'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
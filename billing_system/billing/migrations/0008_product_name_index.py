@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_bill_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='billing_pro_name_197350_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_product_name_index'),
+    ]
+
+    operations = [
+        # Build the replacement indexes before dropping the ones they supersede
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['customer_email', '-created_at', '-id'], name='billing_bil_custome_5692b6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billitem',
+            index=models.Index(fields=['product', 'bill'], name='billing_bil_product_0e7a2e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceemail',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at', 'id'], name='billing_invoiceemail_due_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bill',
+            name='billing_bil_custome_b127bc_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoiceemail',
+            name='billing_inv_status_8c034a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='billing_pro_product_181304_idx',
+        ),
+        migrations.AlterField(
+            model_name='billitem',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='billing.product'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='product_id',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='balancedenomination',
+            constraint=models.CheckConstraint(check=models.Q(('count__gt', 0)), name='balancedenomination_count_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='billitem',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='billitem_quantity_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='customersummary',
+            constraint=models.CheckConstraint(check=models.Q(('bill_count__gte', 0)), name='customersummary_bill_count_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.CheckConstraint(check=models.Q(('line_count__gte', 0), ('quantity__gte', 0)), name='dailysalesrollup_counts_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(check=models.Q(('available_stocks__gte', 0)), name='product_stock_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='shopdenomination',
+            constraint=models.CheckConstraint(check=models.Q(('count__gte', 0)), name='shopdenomination_count_non_negative'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def normalise_customer_emails(apps, schema_editor):
+    """
+    Lower-case stored customer emails so lookups by a normalised address hit
+    the (customer_email, -created_at, -id) index. Summaries that only
+    differed by case are merged into one.
+    """
+    Bill = apps.get_model('billing', 'Bill')
+    CustomerSummary = apps.get_model('billing', 'CustomerSummary')
+
+    Bill.objects.exclude(customer_email=Lower('customer_email')).update(customer_email=Lower('customer_email'))
+
+    for summary in CustomerSummary.objects.exclude(customer_email=Lower('customer_email')).order_by('id'):
+        email = summary.customer_email.lower()
+        target = CustomerSummary.objects.filter(customer_email=email).first()
+        if target is None:
+            summary.customer_email = email
+            summary.save(update_fields=['customer_email'])
+            continue
+
+        target.bill_count += summary.bill_count
+        target.total_spent += summary.total_spent
+        target.total_tax += summary.total_tax
+        if summary.last_purchase_at and (
+            target.last_purchase_at is None or summary.last_purchase_at > target.last_purchase_at
+        ):
+            target.last_purchase_at = summary.last_purchase_at
+        for product_id, quantity in summary.product_quantities.items():
+            target.product_quantities[product_id] = target.product_quantities.get(product_id, 0) + quantity
+        target.save()
+        summary.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_query_indexes_and_checks'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_customer_emails, migrations.RunPython.noop),
+    ]
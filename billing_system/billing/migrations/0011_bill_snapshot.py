@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_normalise_customer_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='snapshot',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0011_bill_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('bill', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='invoice', serialize=False, to='billing.bill')),
+                ('version', models.IntegerField()),
+                ('text', models.BinaryField()),
+                ('html', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
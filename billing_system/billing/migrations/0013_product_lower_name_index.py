@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:01
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_invoicedocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='billing_product_lower_name_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0013_product_lower_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBill',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('customer_email', models.EmailField(max_length=254)),
+                ('rounded_net_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_tax', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('idempotency_key', models.CharField(blank=True, max_length=100, null=True)),
+                ('document', models.BinaryField()),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['customer_email', '-created_at', '-id'], name='billing_arc_custome_3e63ae_idx'), models.Index(fields=['created_at'], name='billing_arc_created_603330_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:12
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0014_archivedbill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['product', 'shard'],
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailysalesrollup',
+            name='unique_daily_sales_rollup',
+        ),
+        migrations.AddField(
+            model_name='dailysalesrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Stock counters checkouts take this product from; 0 keeps it in available_stocks'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='available_stocks',
+            field=models.IntegerField(default=0, help_text='For sharded products, units not yet dealt to the stock counters', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'tax_percentage', 'shard'), name='unique_daily_sales_rollup'),
+        ),
+        migrations.AddField(
+            model_name='stockshard',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_counters', to='billing.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('product', 'shard'), name='unique_stock_shard'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.CheckConstraint(check=models.Q(('count__gte', 0)), name='stockshard_count_non_negative'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0015_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedbill',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -21,11 +24,17 @@ class UserProfile(models.Model):
 
 class Product(models.Model):
     """Product model with stock and pricing information"""
-    product_id = models.CharField(max_length=50, unique=True, db_index=True)
+    product_id = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=200)
     available_stocks = models.IntegerField(
         validators=[MinValueValidator(0)],
-        default=0
+        default=0,
+        help_text="For sharded products, units not yet dealt to the stock counters"
+    )
+    # Changed only by `manage.py shard_stock`, which moves the stock (see stock.py)
+    stock_shards = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Stock counters checkouts take this product from; 0 keeps it in available_stocks"
     )
     price = models.DecimalField(
         max_digits=10,
@@ -44,19 +53,65 @@ class Product(models.Model):
     class Meta:
         ordering = ['name']
         indexes = [
-            models.Index(fields=['product_id']),
+            models.Index(fields=['name', 'id']),
+            # Case-insensitive name prefix search in the admin
+            models.Index(Lower('name'), name='billing_product_lower_name_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(available_stocks__gte=0),
+                name='product_stock_non_negative'
+            ),
         ]
 
     def __str__(self):
         return f"{self.product_id} - {self.name}"
 
+    @property
+    def on_hand(self):
+        """
+        Units in stock. The counters of a sharded product are only included
+        when the row was read with stock.with_counters().
+        """
+        return self.available_stocks + getattr(self, 'counter_stock', 0)
+
     def is_available(self, quantity):
         """Check if requested quantity is available in stock"""
-        return self.available_stocks >= quantity
+        return self.on_hand >= quantity
+
+
+class StockShard(models.Model):
+    """One of the counters a sharded product's stock is split across (see stock.py)"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_counters',
+        # Covered by the (product, shard) constraint
+        db_index=False
+    )
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['product', 'shard']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'shard'],
+                name='unique_stock_shard'
+            ),
+            models.CheckConstraint(
+                check=Q(count__gte=0),
+                name='stockshard_count_non_negative'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} counter {self.shard}: {self.count}"
 
 
 class Bill(models.Model):
     """Bill/Invoice model for customer purchases"""
+    # Stored lower-cased (see checkout.normalise_email) so lookups can use the index
     customer_email = models.EmailField()
     total_price_without_tax = models.DecimalField(
         max_digits=10,
@@ -88,12 +143,17 @@ class Bill(models.Model):
         decimal_places=2,
         default=0
     )
+    # Client-supplied key so a replayed sale returns the original bill
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    # Lines, totals and change as shown on the bill page, written once with the bill (see snapshots.py)
+    snapshot = models.JSONField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['customer_email', '-created_at']),
+            models.Index(fields=['customer_email', '-created_at', '-id']),
+            models.Index(fields=['-created_at', '-id']),
         ]
 
     def __str__(self):
@@ -109,7 +169,9 @@ class BillItem(models.Model):
     )
     product = models.ForeignKey(
         Product,
-        on_delete=models.PROTECT
+        on_delete=models.PROTECT,
+        # Covered by the (product, bill) index
+        db_index=False
     )
     quantity = models.IntegerField(
         validators=[MinValueValidator(1)]
@@ -133,6 +195,16 @@ class BillItem(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            # Sales of one product, joined to their bills
+            models.Index(fields=['product', 'bill']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(quantity__gt=0),
+                name='billitem_quantity_positive'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
@@ -148,6 +220,12 @@ class ShopDenomination(models.Model):
 
     class Meta:
         ordering = ['-value']
+        constraints = [
+            models.CheckConstraint(
+                check=Q(count__gte=0),
+                name='shopdenomination_count_non_negative'
+            ),
+        ]
 
     def __str__(self):
         return f"₹{self.value} x {self.count}"
@@ -165,6 +243,188 @@ class BalanceDenomination(models.Model):
 
     class Meta:
         ordering = ['-value']
+        constraints = [
+            models.CheckConstraint(
+                check=Q(count__gt=0),
+                name='balancedenomination_count_positive'
+            ),
+        ]
 
     def __str__(self):
         return f"₹{self.value} x {self.count}"
+
+
+class InvoiceDocument(models.Model):
+    """The rendered invoice of a bill, zlib-compressed, reused by its email and bill page (see invoices.py)"""
+    bill = models.OneToOneField(
+        Bill,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='invoice'
+    )
+    version = models.IntegerField()
+    text = models.BinaryField()
+    html = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Invoice for Bill #{self.bill_id} (v{self.version})"
+
+
+class ArchivedBill(models.Model):
+    """
+    A bill moved out of the live tables by archive_bills: the columns its
+    lookups need plus its snapshot, zlib-compressed (see archive.py)
+    """
+    # The bill's own ID, so /bill/<id>/ keeps resolving
+    id = models.BigIntegerField(primary_key=True)
+    customer_email = models.EmailField()
+    rounded_net_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+    total_tax = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+    # Still checked by generate_bill and imports, so a replayed sale never bills twice
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    document = models.BinaryField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer_email', '-created_at', '-id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived Bill #{self.id} - {self.customer_email} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class CustomerSummary(models.Model):
+    """Running purchase totals per customer, updated in the same transaction as each bill"""
+    customer_email = models.EmailField(unique=True)
+    bill_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    total_tax = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    last_purchase_at = models.DateTimeField(null=True, blank=True)
+    product_quantities = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Units bought per product_id"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['customer_email']
+        verbose_name_plural = 'customer summaries'
+        constraints = [
+            models.CheckConstraint(
+                check=Q(bill_count__gte=0),
+                name='customersummary_bill_count_non_negative'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_email} - {self.bill_count} bills"
+
+
+class DailySalesRollup(models.Model):
+    """Sales per day, product and tax rate, updated in the same transaction as each bill"""
+    day = models.DateField()
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name='daily_sales'
+    )
+    tax_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2
+    )
+    # Sales of a sharded product are split by the stock counter they were taken from,
+    # so checkouts on different counters never wait for the same row; reports sum them
+    shard = models.PositiveSmallIntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    line_count = models.IntegerField(default=0)
+    total_price_without_tax = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    total_tax = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    total_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+
+    class Meta:
+        ordering = ['day', 'product']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product', 'tax_percentage', 'shard'],
+                name='unique_daily_sales_rollup'
+            ),
+            models.CheckConstraint(
+                check=Q(quantity__gte=0, line_count__gte=0),
+                name='dailysalesrollup_counts_non_negative'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} @ {self.tax_percentage}% x {self.quantity}"
+
+
+class InvoiceEmail(models.Model):
+    """Outbox entry for an invoice email, delivered by the send_invoice_emails command"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    bill = models.ForeignKey(
+        Bill,
+        on_delete=models.CASCADE,
+        related_name='invoice_emails'
+    )
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Only pending entries are ever polled, and they are few
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=Q(status='pending'),
+                name='billing_invoiceemail_due_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Invoice email for Bill #{self.bill_id} to {self.recipient} ({self.status})"
@@ -0,0 +1,117 @@
+"""
+Keyset (cursor) pagination for bill listings.
+
+Pages are ordered newest first on (created_at, id) and each page is fetched
+by seeking past the last row of the previous one, so page 10,000 costs the
+same index range scan as page 1. The next-page token encodes that last row.
+
+EstimatedCountPaginator serves the admin changelists, which need page
+numbers: it takes the row count of an unfiltered table from the database's
+statistics rather than a COUNT(*) that reads the whole table.
+"""
+import base64
+from datetime import datetime
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def encode_cursor(bill):
+    """Opaque token pointing just past `bill` in newest-first order"""
+    raw = f'{bill.created_at.isoformat()}|{bill.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a token, or None if it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, bill_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(bill_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=None):
+    """
+    Return (bills, next_cursor) for the page of `queryset` after `cursor`.
+    `next_cursor` is None on the last page.
+    """
+    return merged_keyset_page([queryset], cursor, page_size)
+
+
+def merged_keyset_page(querysets, cursor=None, page_size=None):
+    """
+    keyset_page over several querysets of rows with distinct IDs, such as
+    live and archived bills, merged newest first. Runs one query per queryset.
+    """
+    page_size = page_size or getattr(settings, 'BILLS_PAGE_SIZE', 50)
+    position = decode_cursor(cursor)
+
+    bills = []
+    for queryset in querysets:
+        bills += _seek(queryset.order_by('-created_at', '-id'), position)[:page_size + 1]
+    if len(querysets) > 1:
+        bills.sort(key=lambda bill: (bill.created_at, bill.id), reverse=True)
+
+    next_cursor = None
+    if len(bills) > page_size:
+        bills = bills[:page_size]
+        next_cursor = encode_cursor(bills[-1])
+    return bills, next_cursor
+
+
+def _seek(queryset, position):
+    if position is None:
+        return queryset
+    created_at, bill_id = position
+    # Equivalent to (created_at, id) < cursor, written as a range on
+    # created_at so the database can seek into the index instead of
+    # scanning from the newest bill
+    return queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=bill_id)
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Row count of `model`'s table from the planner statistics (ANALYZE), or
+    None when there are none. PostgreSQL autovacuum keeps them current;
+    on SQLite they are as old as the last ANALYZE.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                # No sqlite_stat1 table before the first ANALYZE
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts an unfiltered queryset from table statistics once
+    they show more than ADMIN_EXACT_COUNT_LIMIT rows. Filtered querysets and
+    smaller tables are counted exactly. A stale estimate only means the last
+    page numbers are off.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000):
+                return estimate
+        return super().count
@@ -0,0 +1,107 @@
+"""
+Bill pricing shared by checkout and quotes.
+
+The kernel works on parallel sequences of integers: unit prices in paise,
+quantities, and tax rates in basis points (hundredths of a percent). Line
+tax is kept exact in micro-rupees (1/10000 paise), so no amount is rounded
+until it is stored and the rupee round-up never goes through a float.
+
+price_basket wraps the kernel for one basket of Decimals; price_baskets
+prices many baskets laid out back to back in the same flat sequences.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+
+CENT = Decimal('0.01')
+
+# Micro-rupees per paisa and per rupee
+TAX_SCALE = 10000
+RUPEE = 100 * TAX_SCALE
+
+
+def stored(amount):
+    """Round an in-memory amount the way a 2 decimal place DecimalField stores it"""
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+def to_paise(amount):
+    """Exact integer hundredths of a Decimal amount (a price in paise, a tax rate in basis points)"""
+    hundredths = Decimal(amount).scaleb(2)
+    paise = int(hundredths)
+    if paise != hundredths:
+        raise ValueError(f'{amount} has more than 2 decimal places')
+    return paise
+
+
+def from_paise(paise):
+    return Decimal(paise).scaleb(-2)
+
+
+def from_micro(micro):
+    paise, remainder = divmod(micro, TAX_SCALE)
+    if not remainder:
+        return from_paise(paise)
+    return Decimal(micro).scaleb(-6).normalize()
+
+
+def price_lines(unit_prices, quantities, tax_rates):
+    """
+    Price lines given as parallel integer sequences.
+    Returns (subtotals, taxes): paise before tax and tax in micro-rupees, per line.
+    """
+    subtotals = [price * quantity for price, quantity in zip(unit_prices, quantities)]
+    taxes = [subtotal * rate for subtotal, rate in zip(subtotals, tax_rates)]
+    return subtotals, taxes
+
+
+def basket_totals(subtotal, tax):
+    """Totals in micro-rupees for a basket's summed subtotal (paise) and tax (micro-rupees)"""
+    net = subtotal * TAX_SCALE + tax
+    return {
+        'total_price_without_tax': subtotal * TAX_SCALE,
+        'total_tax': tax,
+        'net_price': net,
+        # The customer pays the net price rounded up to a whole rupee
+        'rounded_net_price': -(-net // RUPEE) * RUPEE,
+    }
+
+
+def price_baskets(unit_prices, quantities, tax_rates, offsets):
+    """
+    Price many baskets in one pass. Lines are laid out back to back in the
+    three integer sequences and basket i is lines offsets[i]:offsets[i + 1].
+    Returns one basket_totals dict (micro-rupees) per basket.
+    """
+    subtotals, taxes = price_lines(unit_prices, quantities, tax_rates)
+    return [
+        basket_totals(sum(subtotals[start:end]), sum(taxes[start:end]))
+        for start, end in zip(offsets, offsets[1:])
+    ]
+
+
+def price_basket(lines):
+    """
+    Price (unit_price, quantity, tax_percentage) lines of Decimals.
+    Returns (priced_lines, totals) where each priced line has unit_price,
+    quantity, tax_percentage, total_price_without_tax, tax_amount and
+    total_price, and totals has total_price_without_tax, total_tax,
+    net_price and rounded_net_price. All amounts are exact Decimals.
+    """
+    lines = list(lines)
+    unit_prices = [to_paise(price) for price, _, _ in lines]
+    quantities = [quantity for _, quantity, _ in lines]
+    tax_rates = [to_paise(rate) for _, _, rate in lines]
+    subtotals, taxes = price_lines(unit_prices, quantities, tax_rates)
+
+    priced = [
+        {
+            'unit_price': price,
+            'quantity': quantity,
+            'tax_percentage': rate,
+            'total_price_without_tax': from_paise(subtotal),
+            'tax_amount': from_micro(tax),
+            'total_price': from_micro(subtotal * TAX_SCALE + tax),
+        }
+        for (price, quantity, rate), subtotal, tax in zip(lines, subtotals, taxes)
+    ]
+    totals = basket_totals(sum(subtotals), sum(taxes))
+    return priced, {key: from_micro(amount) for key, amount in totals.items()}
@@ -0,0 +1,158 @@
+"""
+Sales and tax reporting from DailySalesRollup.
+
+generate_bill folds each bill into the rollup inside its transaction, so
+reports never have to scan billing_bill or billing_billitem.
+backfill_rollups rebuilds the rollup for past days in chunks; archived days
+keep the rows they have.
+"""
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Min, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import ArchivedBill, Bill, BillItem, DailySalesRollup
+from .pricing import stored
+
+REPORT_GROUPS = {
+    'day': ['day'],
+    'product': ['product__product_id', 'product__name'],
+    'day_product': ['day', 'product__product_id', 'product__name'],
+    'tax_rate': ['tax_percentage'],
+    'day_tax_rate': ['day', 'tax_percentage'],
+}
+
+
+def record_sales(bill, items, shards=None):
+    """Add a new bill's items to the rollup rows for the day it was created"""
+    add_sales(timezone.localdate(bill.created_at), items, shards)
+
+
+def add_sales(day, items, shards=None):
+    """
+    Add bill items sold on `day` to that day's rollup rows. `shards` maps
+    the pk of each sharded product to the stock counter it was taken from.
+    Callers hold row locks on the products being sold, or on that counter,
+    so two checkouts can never race to create the same (day, product, tax
+    rate, shard) row.
+    """
+    shards = shards or {}
+    deltas = {}
+    for item in items:
+        key = (item.product_id, stored(item.tax_percentage), shards.get(item.product_id, 0))
+        delta = deltas.setdefault(key, {
+            'quantity': 0, 'line_count': 0, 'total_price_without_tax': 0, 'total_tax': 0, 'total_price': 0,
+        })
+        delta['quantity'] += item.quantity
+        delta['line_count'] += 1
+        # Same arithmetic as the backfill, which only sees the stored values
+        delta['total_price_without_tax'] += stored(item.total_price) - stored(item.tax_amount)
+        delta['total_tax'] += stored(item.tax_amount)
+        delta['total_price'] += stored(item.total_price)
+    if not deltas:
+        return
+
+    # Lock only the rows of the counters taken from; other checkouts hold the rest
+    rows = Q()
+    for product_id in {product_id for product_id, _, _ in deltas}:
+        rows |= Q(product_id=product_id, shard=shards.get(product_id, 0))
+    existing = {
+        (row.product_id, row.tax_percentage, row.shard): row
+        for row in DailySalesRollup.objects.select_for_update().filter(rows, day=day)
+    }
+    to_create = []
+    for (product_id, tax_percentage, shard), delta in deltas.items():
+        row = existing.get((product_id, tax_percentage, shard))
+        if row is None:
+            to_create.append(DailySalesRollup(
+                day=day, product_id=product_id, tax_percentage=tax_percentage, shard=shard, **delta
+            ))
+            continue
+        for field, amount in delta.items():
+            setattr(row, field, getattr(row, field) + amount)
+
+    if existing:
+        DailySalesRollup.objects.bulk_update(existing.values(), [
+            'quantity', 'line_count', 'total_price_without_tax', 'total_tax', 'total_price',
+        ])
+    if to_create:
+        DailySalesRollup.objects.bulk_create(to_create)
+
+
+def day_bounds(day):
+    """Aware datetimes for the start of `day` and of the following day"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def backfill_rollups(start=None, end=None, chunk_days=7):
+    """
+    Recompute the rollup from bill items for `start`..`end` (inclusive,
+    defaulting to the whole history), `chunk_days` days per transaction.
+    Days up to the newest archived bill keep their rollup rows, as their
+    items are gone. Yields (first_day, last_day, rows_written) after each chunk.
+    """
+    if start is None or end is None:
+        span = Bill.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if span['first'] is None:
+            return
+        start = start or timezone.localdate(span['first'])
+        end = end or timezone.localdate(span['last'])
+
+    archived_until = ArchivedBill.objects.aggregate(last=Max('created_at'))['last']
+    if archived_until is not None:
+        start = max(start, timezone.localdate(archived_until) + timedelta(days=1))
+
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        yield chunk_start, chunk_end, _backfill_chunk(chunk_start, chunk_end)
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+@transaction.atomic
+def _backfill_chunk(first_day, last_day):
+    DailySalesRollup.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+
+    lower, _ = day_bounds(first_day)
+    _, upper = day_bounds(last_day)
+    rows = (
+        BillItem.objects.filter(bill__created_at__gte=lower, bill__created_at__lt=upper)
+        .annotate(day=TruncDate('bill__created_at'))
+        .values('day', 'product_id', 'tax_percentage')
+        .annotate(
+            quantity=Sum('quantity'),
+            line_count=Count('id'),
+            total_tax=Sum('tax_amount'),
+            total_price=Sum('total_price'),
+        )
+        .order_by()
+    )
+    rollups = [
+        DailySalesRollup(total_price_without_tax=row['total_price'] - row['total_tax'], **row)
+        for row in rows
+    ]
+    DailySalesRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def sales_report(start, end, group='day'):
+    """Revenue and tax between `start` and `end` (inclusive) grouped by REPORT_GROUPS[group]"""
+    fields = REPORT_GROUPS[group]
+    rollups = DailySalesRollup.objects.all()
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+
+    totals = {'quantity': Sum('quantity'), 'revenue_without_tax': Sum('total_price_without_tax'),
+              'tax': Sum('total_tax'), 'revenue': Sum('total_price')}
+    rows = list(rollups.values(*fields).annotate(**totals).order_by(*fields))
+    overall = rollups.aggregate(**totals)
+
+    # Some backends return sums of decimals with float-like precision
+    for row in rows + [overall]:
+        for key in ('revenue_without_tax', 'tax', 'revenue'):
+            row[key] = stored(row[key] or 0)
+        row['quantity'] = row['quantity'] or 0
+    return rows, overall
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, ShopDenomination
+from .catalogue import invalidate_products, bump_catalogue_version
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """Forget cached lookups and catalogue pages for a product once the change is committed"""
+    def invalidate():
+        invalidate_products([instance.product_id])
+        bump_catalogue_version()
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=ShopDenomination)
+def invalidate_denomination_pages(sender, instance, **kwargs):
+    """Retire cached pages listing the shop's denominations"""
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
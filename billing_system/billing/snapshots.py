@@ -0,0 +1,96 @@
+"""
+Immutable bill snapshots.
+
+A bill never changes once generate_bill commits, so its lines, totals and
+change are written once, as a JSON document on the bill row, in the same
+transaction that creates it. Invoices are rendered from that document, read
+from the cache or from the one row, instead of joining items, products and
+denominations.
+
+Documents carry SNAPSHOT_VERSION. Bump it whenever the document changes:
+older snapshots are rebuilt from the bill's rows on their next read. Bill
+pages and emails are rendered from snapshots by invoices.py, whose
+INVOICE_VERSION must be bumped with it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from .models import Bill, BillItem
+from .pricing import stored
+
+SNAPSHOT_VERSION = 2
+
+TOTAL_FIELDS = ('total_price_without_tax', 'total_tax', 'net_price', 'rounded_net_price', 'amount_paid', 'balance')
+
+
+def build_snapshot(bill, items, balance_denominations):
+    """
+    The snapshot document for a priced bill. Amounts are strings with two
+    decimal places so the document survives JSON unchanged.
+    """
+    return {
+        'version': SNAPSHOT_VERSION,
+        'lines': [
+            {
+                'product_id': item.product.product_id,
+                'name': item.product.name,
+                'unit_price': str(stored(item.unit_price)),
+                'quantity': item.quantity,
+                'tax_percentage': str(stored(item.tax_percentage)),
+                'tax_amount': str(stored(item.tax_amount)),
+                'total_price': str(stored(item.total_price)),
+            }
+            for item in items
+        ],
+        **{field: str(stored(getattr(bill, field))) for field in TOTAL_FIELDS},
+        'change': [{'value': bd.value, 'count': bd.count} for bd in balance_denominations],
+    }
+
+
+def snapshot_key(bill_id):
+    return f'bill-snapshot:{SNAPSHOT_VERSION}:{bill_id}'
+
+
+def snapshot_cache_timeout():
+    return getattr(settings, 'BILL_SNAPSHOT_CACHE_TIMEOUT', 86400)
+
+
+def get_bill_snapshot(bill_id):
+    """
+    The bill page's data: id, customer_email and created_at plus the snapshot
+    document, or None if there is no such bill. Served from the cache, else
+    from the bill row in one query; bills without a current snapshot get one
+    written from their items on the way.
+    """
+    key = snapshot_key(bill_id)
+    receipt = cache.get(key)
+    if receipt is not None:
+        return receipt
+
+    row = Bill.objects.filter(pk=bill_id).values('id', 'customer_email', 'created_at', 'snapshot').first()
+    if row is None:
+        return None
+    snapshot = row.pop('snapshot')
+    if not snapshot or snapshot.get('version') != SNAPSHOT_VERSION:
+        snapshot = rebuild_snapshot(bill_id)
+
+    receipt = {**row, **snapshot}
+    cache.set(key, receipt, snapshot_cache_timeout())
+    return receipt
+
+
+def rebuild_snapshot(bill_id):
+    """Write the snapshot of a bill created before snapshots, or under an older version"""
+    return rebuild_snapshots([bill_id])[bill_id]
+
+
+def rebuild_snapshots(bill_ids):
+    """rebuild_snapshot for several bills, with one read per relation and one UPDATE"""
+    bills = list(Bill.objects.prefetch_related(
+        Prefetch('items', queryset=BillItem.objects.select_related('product')),
+        'balance_denominations',
+    ).filter(pk__in=bill_ids))
+    for bill in bills:
+        bill.snapshot = build_snapshot(bill, bill.items.all(), bill.balance_denominations.all())
+    Bill.objects.bulk_update(bills, ['snapshot'])
+    return {bill.id: bill.snapshot for bill in bills}
@@ -0,0 +1,127 @@
+"""
+Sharded stock counters for hot products.
+
+Every checkout that sells a product locks its row until the bill commits,
+so during a promotion all tills queue behind the same few rows. shard_stock
+splits such a product's stock across `stock_shards` StockShard counters.
+Checkouts then take units from one counter, picked at random, with a
+guarded UPDATE and never lock the product row: up to `stock_shards`
+checkouts of the product proceed at once. Each counter also guards its own
+rows of the daily sales rollup, which would otherwise be the next hot row.
+
+When the picked counter runs short, the checkout locks the product and all
+its counters, takes what it needs and deals the rest out evenly again. The
+stock of a sharded product is its counters plus available_stocks, which
+holds units not yet dealt out (a restock entered in the admin, say);
+querysets read with with_counters() give it as Product.on_hand.
+"""
+import random
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from .models import Product, StockShard
+
+
+def with_counters(queryset):
+    """Annotate products with `counter_stock`, the units in their counters, for Product.on_hand"""
+    counters = (
+        StockShard.objects.filter(product=OuterRef('pk'))
+        .order_by().values('product').annotate(total=Sum('count')).values('total')
+    )
+    return queryset.annotate(counter_stock=Coalesce(Subquery(counters), 0))
+
+
+def deal(units, shards):
+    """Split `units` as evenly as possible across `shards` counters"""
+    share, extra = divmod(units, shards)
+    return [share + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def shard_stock(product_id, shards):
+    """
+    Deal a product's stock out across `shards` counters, or gather it back
+    into available_stocks with shards=0. With the current count it simply
+    rebalances the counters. Returns the product, read with its counters.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(product_id=product_id)
+        counters = StockShard.objects.select_for_update().filter(product=product)
+        units = product.available_stocks + sum(counters.values_list('count', flat=True))
+
+        counters.delete()
+        StockShard.objects.bulk_create(
+            [StockShard(product=product, shard=shard, count=count) for shard, count in enumerate(deal(units, shards))]
+            if shards else []
+        )
+        product.stock_shards = shards
+        product.available_stocks = 0 if shards else units
+        # save() so the Product signals retire cached lookups and pages
+        product.save(update_fields=['stock_shards', 'available_stocks', 'updated_at'])
+    return with_counters(Product.objects.filter(pk=product.pk)).get()
+
+
+def take_from_counters(products, requested):
+    """
+    Take the `requested` units of sharded products, in product_id order.
+    Returns (shards, short): the counter each product was taken from, by
+    product pk, and the first product that could not be served, or None.
+    """
+    shards = {}
+    for product_id in sorted(requested):
+        product = products[product_id]
+        quantity = requested[product_id]
+        shard = random.randrange(product.stock_shards)
+        taken = (
+            StockShard.objects.filter(product=product, shard=shard, count__gte=quantity)
+            .update(count=F('count') - quantity)
+        )
+        if not taken:
+            # Too few units on this counter: take from all of them and rebalance.
+            # Holding every counter, any of them may guard the rollup rows.
+            gather_counters([product])
+            if not product.is_available(quantity):
+                return shards, product
+            if product.stock_shards:
+                product.counter_stock -= quantity
+                shard %= product.stock_shards
+            else:
+                product.available_stocks -= quantity
+                shard = 0
+            spread_counters([product])
+        shards[product.pk] = shard
+    return shards, None
+
+
+def gather_counters(products):
+    """
+    Lock sharded products and their counters, product by product in
+    product_id order, and load their whole stock into `counter_stock`, so
+    sales can be checked and taken in memory and written with spread_counters.
+    Products unsharded in the meantime get their current available_stocks.
+    """
+    for product in sorted(products, key=lambda product: product.product_id):
+        row = Product.objects.select_for_update().filter(pk=product.pk).values('available_stocks', 'stock_shards').get()
+        counts = StockShard.objects.select_for_update().filter(product=product).values_list('count', flat=True)
+        product.stock_shards = row['stock_shards']
+        if product.stock_shards:
+            product.available_stocks = 0
+            product.counter_stock = row['available_stocks'] + sum(counts)
+        else:
+            product.available_stocks = row['available_stocks']
+            product.counter_stock = 0
+
+
+def spread_counters(products):
+    """Write back the stock of products loaded by gather_counters, dealt out evenly"""
+    for product in products:
+        if not product.stock_shards:
+            Product.objects.filter(pk=product.pk).update(available_stocks=product.available_stocks)
+            continue
+        counts = deal(product.counter_stock, product.stock_shards)
+        StockShard.objects.filter(product=product).update(count=Case(
+            *[When(shard=shard, then=Value(count)) for shard, count in enumerate(counts)],
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+        # Units that were waiting in available_stocks are on the counters now
+        Product.objects.filter(pk=product.pk, available_stocks__gt=0).update(available_stocks=0)
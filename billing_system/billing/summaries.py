@@ -0,0 +1,157 @@
+"""
+Per-customer purchase summaries.
+
+generate_bill calls record_purchase inside its transaction, so a
+CustomerSummary row always agrees with the committed bills.
+rebuild_summaries recomputes every row from history, archived bills
+included, in chunks.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from .archive import unpack_snapshot
+from .models import ArchivedBill, Bill, BillItem, CustomerSummary, Product
+from .pricing import stored
+
+
+def record_purchase(bill, lines):
+    """Fold one new bill and its (product_id, quantity) lines into the customer's summary"""
+    return record_purchases([(bill, lines)])[bill.customer_email]
+
+
+def record_purchases(purchases):
+    """
+    Fold new (bill, lines) purchases into their customers' summaries with one
+    locked SELECT and one bulk UPDATE, plus one INSERT for first-time customers.
+    Returns the updated summaries by customer email.
+    """
+    emails = sorted({bill.customer_email for bill, _ in purchases})
+    locked = CustomerSummary.objects.select_for_update().order_by('customer_email')
+    summaries = {summary.customer_email: summary for summary in locked.filter(customer_email__in=emails)}
+    missing = [email for email in emails if email not in summaries]
+    if missing:
+        # Another checkout may create the same row first; ignore the conflict and lock what exists
+        CustomerSummary.objects.bulk_create(
+            [CustomerSummary(customer_email=email) for email in missing], ignore_conflicts=True
+        )
+        summaries.update(
+            (summary.customer_email, summary) for summary in locked.filter(customer_email__in=missing)
+        )
+
+    for bill, lines in purchases:
+        summary = summaries[bill.customer_email]
+        summary.bill_count += 1
+        # Add the amounts as saved on the bill so a rebuild gives the same totals
+        summary.total_spent += stored(bill.rounded_net_price)
+        summary.total_tax += stored(bill.total_tax)
+        if summary.last_purchase_at is None or bill.created_at > summary.last_purchase_at:
+            summary.last_purchase_at = bill.created_at
+        for product_id, quantity in lines:
+            summary.product_quantities[product_id] = summary.product_quantities.get(product_id, 0) + quantity
+
+    now = timezone.now()
+    for summary in summaries.values():
+        summary.updated_at = now
+    CustomerSummary.objects.bulk_update(summaries.values(), [
+        'bill_count', 'total_spent', 'total_tax', 'last_purchase_at', 'product_quantities', 'updated_at',
+    ])
+    return summaries
+
+
+def top_products(summary, limit=5):
+    """Most bought products for a summary, as dicts with product_id, name and quantity"""
+    if summary is None:
+        return []
+    ranked = sorted(summary.product_quantities.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]
+    names = dict(
+        Product.objects.filter(product_id__in=[product_id for product_id, _ in ranked])
+        .values_list('product_id', 'name')
+    )
+    return [
+        {'product_id': product_id, 'name': names.get(product_id, product_id), 'quantity': quantity}
+        for product_id, quantity in ranked
+    ]
+
+
+def rebuild_summaries(batch_size=500):
+    """
+    Recompute every CustomerSummary from live and archived bills,
+    `batch_size` customers per transaction, and remove summaries for
+    customers with no bills left. Returns the number of summaries written.
+    """
+    emails = (
+        Bill.objects.order_by().values_list('customer_email', flat=True)
+        .union(ArchivedBill.objects.order_by().values_list('customer_email', flat=True))
+        .order_by('customer_email')
+    )
+
+    written = 0
+    batch = []
+    for email in emails.iterator(chunk_size=batch_size):
+        batch.append(email)
+        if len(batch) == batch_size:
+            written += _write_batch(batch)
+            batch = []
+    if batch:
+        written += _write_batch(batch)
+
+    CustomerSummary.objects.exclude(
+        customer_email__in=Bill.objects.values('customer_email')
+    ).exclude(
+        customer_email__in=ArchivedBill.objects.values('customer_email')
+    ).delete()
+    return written
+
+
+@transaction.atomic
+def _write_batch(emails):
+    rows = {
+        email: {'bill_count': 0, 'total_spent': 0, 'total_tax': 0, 'last_purchase_at': None}
+        for email in emails
+    }
+    for model in (Bill, ArchivedBill):
+        totals = (
+            model.objects.filter(customer_email__in=emails)
+            .values('customer_email')
+            .annotate(
+                bill_count=Count('id'),
+                total_spent=Sum('rounded_net_price'),
+                total_tax=Sum('total_tax'),
+                last_purchase_at=Max('created_at'),
+            )
+            .order_by()
+        )
+        for total in totals:
+            row = rows[total['customer_email']]
+            row['bill_count'] += total['bill_count']
+            row['total_spent'] += total['total_spent']
+            row['total_tax'] += total['total_tax']
+            if row['last_purchase_at'] is None or total['last_purchase_at'] > row['last_purchase_at']:
+                row['last_purchase_at'] = total['last_purchase_at']
+
+    quantities = {email: {} for email in emails}
+    per_product = (
+        BillItem.objects.filter(bill__customer_email__in=emails)
+        .values_list('bill__customer_email', 'product__product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    for email, product_id, quantity in per_product:
+        quantities[email][product_id] = quantity
+    # Archived lines only survive inside their snapshots
+    archived = ArchivedBill.objects.filter(customer_email__in=emails).values_list('customer_email', 'document')
+    for email, document in archived.iterator(chunk_size=2000):
+        for line in unpack_snapshot(document)['lines']:
+            product_id = line['product_id']
+            quantities[email][product_id] = quantities[email].get(product_id, 0) + line['quantity']
+
+    CustomerSummary.objects.bulk_create(
+        [
+            CustomerSummary(customer_email=email, product_quantities=quantities[email], **row)
+            for email, row in rows.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['customer_email'],
+        update_fields=['bill_count', 'total_spent', 'total_tax', 'last_purchase_at', 'product_quantities'],
+    )
+    return len(rows)
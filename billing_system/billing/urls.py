@@ -10,8 +10,14 @@ urlpatterns = [
     path('customer-purchases/', views.customer_purchases, name='customer_purchases'),
     path('products/', views.products_list, name='products_list'),
     path('bills/', views.bills_list, name='bills_list'),
+    path('bills/export/', views.export_bills, name='export_bills'),
+    path('bills/import/', views.import_bills, name='import_bills'),
     path('users/', views.users_list, name='users_list'),
     path('user/<int:user_id>/', views.user_detail, name='user_detail'),
     path('user-profile/', views.user_profile_form, name='user_profile_form'),
     path('api/product/<str:product_id>/', views.get_product_info, name='get_product_info'),
+    path('api/products/batch/', views.get_products_batch, name='get_products_batch'),
+    path('api/quote/', views.quote, name='quote'),
+    path('api/reports/sales/', views.sales_report_api, name='sales_report'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,155 +1,215 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+import hashlib
+import logging
+from django.shortcuts import redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction
-from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from decimal import Decimal
-from .models import Product, Bill, BillItem, ShopDenomination, BalanceDenomination, UserProfile
+from .models import Product, Bill, ShopDenomination, BalanceDenomination, UserProfile, CustomerSummary, ArchivedBill
+from .checkout import (
+    CheckoutError, parse_bill_items, normalise_email, create_bill_items, parse_denomination_counts,
+    parse_tendered, apply_denomination_deltas
+)
+from .emails import queue_invoice_email
+from .change import get_change_engine, snapshot_inventory
+from .pagination import keyset_page, merged_keyset_page
+from .catalogue import get_product, get_products, catalogue_version, catalogue_page_timeout, search_products
+from .summaries import record_purchase, top_products
+from .reports import REPORT_GROUPS, record_sales, sales_report
+from .pricing import price_basket, stored
+from .ingest import ingest_bills
+from .snapshots import build_snapshot
+from .archive import bill_receipts, bills_by_key
+from .stock import with_counters
+from .invoices import bill_etag, get_invoice_html, store_invoices
+from .instrumentation import expose_metrics, render, span
+from .export import EXPORT_FORMATS, archived_export_queryset, export_queryset, iter_export, parse_export_date
 import json
-import math
+
+logger = logging.getLogger(__name__)
 
 
 def index(request):
     """Main billing page"""
-    products = Product.objects.all()
+    # Lazy: only evaluated when the cached denominations fragment has expired
     denominations = ShopDenomination.objects.all()
     return render(request, 'billing/index.html', {
-        'products': products,
-        'denominations': denominations
+        'denominations': denominations,
+        'catalogue_version': catalogue_version()
     })
 
 
+@require_http_methods(["POST"])
+@csrf_exempt
+def quote(request):
+    """API endpoint to price a basket without creating a bill"""
+    try:
+        data = json.loads(request.body)
+        lines = parse_bill_items(data.get('bill_items', []))
+        amount_paid = data.get('amount_paid')
+        amount_paid = Decimal(str(amount_paid)) if amount_paid not in (None, '') else None
+    except (ValueError, TypeError, AttributeError, ArithmeticError):
+        return JsonResponse({'error': 'Invalid quote request'}, status=400)
+    
+    products, not_found = get_products(product_id for product_id, _ in lines)
+    lines = [(product_id, quantity) for product_id, quantity in lines if product_id in products]
+    priced, totals = price_basket(
+        (Decimal(products[product_id]['price']), quantity, Decimal(products[product_id]['tax_percentage']))
+        for product_id, quantity in lines
+    )
+    
+    requested = {}
+    for product_id, quantity in lines:
+        requested[product_id] = requested.get(product_id, 0) + quantity
+    insufficient_stock = [
+        product_id for product_id, quantity in requested.items()
+        if quantity > products[product_id]['available_stocks']
+    ]
+    
+    result = {
+        'success': True,
+        'lines': [
+            {
+                'product_id': product_id,
+                'name': products[product_id]['name'],
+                'quantity': line['quantity'],
+                'unit_price': stored(line['unit_price']),
+                'tax_percentage': stored(line['tax_percentage']),
+                'total_price_without_tax': stored(line['total_price_without_tax']),
+                'tax_amount': stored(line['tax_amount']),
+                'total_price': stored(line['total_price'])
+            }
+            for (product_id, _), line in zip(lines, priced)
+        ],
+        'total_price_without_tax': stored(totals['total_price_without_tax']),
+        'total_tax': stored(totals['total_tax']),
+        'net_price': stored(totals['net_price']),
+        'rounded_net_price': stored(totals['rounded_net_price']),
+        'not_found': not_found,
+        'insufficient_stock': insufficient_stock
+    }
+    if amount_paid is not None:
+        result['balance'] = stored(amount_paid - totals['rounded_net_price'])
+    return JsonResponse(result)
+
+
 def calculate_balance_denominations(balance_amount, shop_denominations):
     """
     Calculate the denominations to return as balance.
-    Uses a greedy algorithm to minimize the number of notes/coins.
+    Delegates to the configured change engine (settings.CHANGE_ENGINE), which
+    by default finds the fewest notes the shop can actually hand back.
+    Returns None when the balance cannot be paid from the available notes.
     """
-    balance = int(balance_amount)
-    result = []
-    
-    # Sort denominations by value (highest first)
-    sorted_denoms = sorted(shop_denominations, key=lambda x: x.value, reverse=True)
-    
-    for denom in sorted_denoms:
-        if balance <= 0:
-            break
-            
-        if denom.count > 0 and balance >= denom.value:
-            # Calculate how many of this denomination we can use
-            max_possible = balance // denom.value
-            available = min(max_possible, denom.count)
-            
-            if available > 0:
-                result.append({
-                    'value': denom.value,
-                    'count': available
-                })
-                balance -= denom.value * available
-    
-    if balance > 0:
-        # Not enough denominations available
-        return None
-    
-    return result
+    return get_change_engine().make_change(
+        int(balance_amount), snapshot_inventory(shop_denominations)
+    )
+
+
+def bill_created_response(bill_id, replayed=False):
+    """The generate_bill success response; replays of an Idempotency-Key are marked in a header"""
+    response = JsonResponse({
+        'success': True,
+        'bill_id': bill_id,
+        'redirect_url': f'/bill/{bill_id}/'
+    })
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
 
 
 @require_http_methods(["POST"])
 @csrf_exempt
-@transaction.atomic
 def generate_bill(request):
-    """Generate bill and send invoice via email"""
+    """
+    Generate bill and send invoice via email.
+    A client that retries with the same Idempotency-Key header gets the
+    original bill back instead of a second charge.
+    """
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip() or None
+    if idempotency_key:
+        if len(idempotency_key) > 100:
+            return JsonResponse({'error': 'Idempotency-Key must be at most 100 characters'}, status=400)
+        
+        # Retries of a committed bill return at once without touching stock or
+        # notes. Looked up before the transaction opens: on SQLite a read would
+        # pin a snapshot, and the Bill INSERT would then fail with "database is
+        # locked" instead of waiting for a concurrent checkout to commit.
+        bill_id = bills_by_key([idempotency_key]).get(idempotency_key)
+        if bill_id is not None:
+            return bill_created_response(bill_id, replayed=True)
+    
+    return _generate_bill(request, idempotency_key)
+
+
+@transaction.atomic
+def _generate_bill(request, idempotency_key):
+    """The checkout itself, in one transaction whose first statement is the Bill INSERT"""
+    # Parse the whole request before the Bill INSERT, so bad input never takes the key
     try:
         data = json.loads(request.body)
-        
-        customer_email = data.get('customer_email', '').strip()
-        bill_items = data.get('bill_items', [])
-        denomination_counts = data.get('denomination_counts', {})
+        customer_email = normalise_email(data.get('customer_email', ''))
+        lines = parse_bill_items(data.get('bill_items', []))
+        denomination_counts = parse_denomination_counts(data.get('denomination_counts') or {})
         amount_paid = Decimal(str(data.get('amount_paid', 0)))
+        if not amount_paid.is_finite():
+            raise ValueError('amount_paid must be a number')
+    except (ValueError, TypeError, AttributeError, ArithmeticError):
+        return JsonResponse({'error': 'Invalid bill items, denomination counts or amount paid'}, status=400)
+    
+    # Validation
+    if not customer_email:
+        return JsonResponse({'error': 'Customer email is required'}, status=400)
+    
+    if not lines:
+        return JsonResponse({'error': 'At least one product is required'}, status=400)
+    
+    try:
+        # Create bill. A concurrent request with the same key blocks on the
+        # unique index until this one commits, then replays its bill; the
+        # savepoint that makes that recoverable is only needed with a key.
+        try:
+            with transaction.atomic(savepoint=idempotency_key is not None):
+                bill = Bill.objects.create(
+                    customer_email=customer_email,
+                    amount_paid=amount_paid,
+                    idempotency_key=idempotency_key
+                )
+        except IntegrityError:
+            bill_id = Bill.objects.filter(idempotency_key=idempotency_key).values_list('id', flat=True).first()
+            if bill_id is None:
+                raise
+            return bill_created_response(bill_id, replayed=True)
         
-        # Validation
-        if not customer_email:
-            return JsonResponse({'error': 'Customer email is required'}, status=400)
-        
-        if not bill_items:
-            return JsonResponse({'error': 'At least one product is required'}, status=400)
-        
-        # Update shop denominations
-        shop_denominations = []
-        for denom in ShopDenomination.objects.all():
-            count_to_add = int(denomination_counts.get(str(denom.value), 0))
-            denom.count += count_to_add
-            denom.save()
-            shop_denominations.append(denom)
-        
-        # Create bill
-        bill = Bill.objects.create(
-            customer_email=customer_email,
-            amount_paid=amount_paid
-        )
-        
-        total_price_without_tax = Decimal('0')
-        total_tax = Decimal('0')
+        # Read shop denominations once; tendered notes can be handed back as change
+        shop_denominations = list(ShopDenomination.objects.all())
+        tendered = parse_tendered(denomination_counts, shop_denominations)
+        for denom in shop_denominations:
+            denom.count += tendered.get(denom.value, 0)
         
-        # Process each bill item
-        for item_data in bill_items:
-            product_id = item_data.get('product_id', '').strip()
-            quantity = int(item_data.get('quantity', 0))
-            
-            if not product_id or quantity <= 0:
-                continue
-            
-            try:
-                product = Product.objects.select_for_update().get(product_id=product_id)
-            except Product.DoesNotExist:
-                transaction.set_rollback(True)
-                return JsonResponse({'error': f'Product {product_id} not found'}, status=400)
-            
-            # Check stock availability
-            if not product.is_available(quantity):
-                transaction.set_rollback(True)
-                return JsonResponse({
-                    'error': f'Insufficient stock for {product.name}. Available: {product.available_stocks}'
-                }, status=400)
-            
-            # Calculate prices
-            unit_price = product.price
-            item_total_without_tax = unit_price * quantity
-            tax_amount = (item_total_without_tax * product.tax_percentage) / Decimal('100')
-            item_total = item_total_without_tax + tax_amount
-            
-            # Create bill item
-            BillItem.objects.create(
-                bill=bill,
-                product=product,
-                quantity=quantity,
-                unit_price=unit_price,
-                tax_percentage=product.tax_percentage,
-                tax_amount=tax_amount,
-                total_price=item_total
-            )
-            
-            # Update totals
-            total_price_without_tax += item_total_without_tax
-            total_tax += tax_amount
-            
-            # Update stock
-            product.available_stocks -= quantity
-            product.save()
+        # Process all bill items in one batch
+        try:
+            items, totals, shards = create_bill_items(bill, lines)
+        except CheckoutError as e:
+            transaction.set_rollback(True)
+            return JsonResponse({'error': str(e)}, status=400)
         
         # Calculate final amounts
-        net_price = total_price_without_tax + total_tax
-        rounded_net_price = Decimal(str(math.ceil(float(net_price))))
-        balance = amount_paid - rounded_net_price
+        balance = amount_paid - totals['rounded_net_price']
         
         # Update bill
-        bill.total_price_without_tax = total_price_without_tax
-        bill.total_tax = total_tax
-        bill.net_price = net_price
-        bill.rounded_net_price = rounded_net_price
+        bill.total_price_without_tax = totals['total_price_without_tax']
+        bill.total_tax = totals['total_tax']
+        bill.net_price = totals['net_price']
+        bill.rounded_net_price = totals['rounded_net_price']
         bill.balance = balance
-        bill.save()
         
         # Calculate balance denominations
         if balance < 0:
@@ -158,103 +218,108 @@ def generate_bill(request):
         
         balance_denoms = []
         if balance > 0:
-            balance_denoms = calculate_balance_denominations(balance, shop_denominations)
+            with span('change'):
+                balance_denoms = calculate_balance_denominations(balance, shop_denominations)
             
             if balance_denoms is None:
                 transaction.set_rollback(True)
                 return JsonResponse({
                     'error': 'Insufficient denominations available to return balance'
                 }, status=400)
-            
-            # Save balance denominations and update shop denominations
-            for denom_data in balance_denoms:
-                BalanceDenomination.objects.create(
-                    bill=bill,
-                    value=denom_data['value'],
-                    count=denom_data['count']
-                )
-                
-                # Deduct from shop denominations
-                shop_denom = ShopDenomination.objects.get(value=denom_data['value'])
-                shop_denom.count -= denom_data['count']
-                shop_denom.save()
+        returned = [
+            BalanceDenomination(bill=bill, value=denom_data['value'], count=denom_data['count'])
+            for denom_data in balance_denoms
+        ]
         
-        # Send email asynchronously (in production, use Celery or similar)
-        send_invoice_email(bill)
+        # The bill is final now: save it with the snapshot its page is served from
+        bill.snapshot = build_snapshot(bill, items, returned)
+        bill.save()
+        if returned:
+            BalanceDenomination.objects.bulk_create(returned)
         
-        return JsonResponse({
-            'success': True,
-            'bill_id': bill.id,
-            'redirect_url': f'/bill/{bill.id}/'
-        })
+        # Apply tendered and returned notes to the shop in one statement
+        try:
+            apply_denomination_deltas(tendered, balance_denoms)
+        except CheckoutError as e:
+            transaction.set_rollback(True)
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        # Keep the customer's running totals and the sales rollup in step with this bill
+        with span('summaries'):
+            record_purchase(bill, lines)
+            record_sales(bill, items, shards)
+        
+        # Render the invoice once for the bill page and the email;
+        # send_invoice_emails delivers the email after commit
+        with span('email'):
+            invoices = store_invoices([bill])
+            queue_invoice_email(bill, invoices[bill.id])
+        
+        return bill_created_response(bill.id)
         
     except Exception as e:
+        # The Bill row and its key are already written; none of it may commit
+        transaction.set_rollback(True)
+        logger.exception('generate_bill failed')
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def send_invoice_email(bill):
-    """Send invoice email to customer"""
-    subject = f'Invoice #{bill.id} - Thank you for your purchase'
-    
-    # Build email message
-    items_text = '\n'.join([
-        f"  {item.product.name} x {item.quantity} @ ₹{item.unit_price} = ₹{item.total_price}"
-        for item in bill.items.all()
-    ])
-    
-    balance_text = ''
-    if bill.balance > 0:
-        balance_denoms = '\n'.join([
-            f"  ₹{bd.value} x {bd.count}"
-            for bd in bill.balance_denominations.all()
-        ])
-        balance_text = f"\n\nBalance Denominations:\n{balance_denoms}"
+@require_http_methods(["POST"])
+@csrf_exempt
+def import_bills(request):
+    """API endpoint for offline terminals to replay queued sales as JSONL, one bill per line"""
+    try:
+        lines = request.body.decode('utf-8').splitlines()
+        chunk_size = int(request.GET.get('chunk_size', getattr(settings, 'BILL_IMPORT_CHUNK_SIZE', 100)))
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({'error': 'Invalid import request'}, status=400)
+    if chunk_size < 1:
+        return JsonResponse({'error': 'chunk_size must be positive'}, status=400)
     
-    message = f"""
-Dear Customer,
-
-Thank you for your purchase!
-
-Invoice #: {bill.id}
-Date: {bill.created_at.strftime('%Y-%m-%d %H:%M:%S')}
-
-Items Purchased:
-{items_text}
-
-Total (without tax): ₹{bill.total_price_without_tax}
-Total Tax: ₹{bill.total_tax}
-Net Price: ₹{bill.net_price}
-Rounded Price: ₹{bill.rounded_net_price}
-Amount Paid: ₹{bill.amount_paid}
-Balance: ₹{bill.balance}{balance_text}
-
-Thank you for shopping with us!
-
-Best regards,
-Billing System
-    """
+    limit = getattr(settings, 'BILL_IMPORT_LIMIT', 1000)
+    if sum(1 for line in lines if line.strip()) > limit:
+        return JsonResponse({'error': f'At most {limit} bills per request'}, status=400)
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [bill.customer_email],
-            fail_silently=True,
-        )
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    results = list(ingest_bills(lines, chunk_size))
+    counts = {status: sum(1 for result in results if result['status'] == status)
+              for status in ('created', 'duplicate', 'error')}
+    return JsonResponse({
+        'success': True,
+        'created': counts['created'],
+        'duplicates': counts['duplicate'],
+        'errors': counts['error'],
+        'results': results
+    })
 
 
 def bill_detail(request, bill_id):
-    """Display bill details"""
-    bill = get_object_or_404(Bill, id=bill_id)
-    return render(request, 'billing/bill_detail.html', {'bill': bill})
+    """
+    Display bill details from the bill's pre-rendered invoice.
+    Bills never change, so the page carries a strong ETag and may be cached
+    privately for BILL_PAGE_MAX_AGE seconds; revalidation is a 304, served
+    from the cached invoice without touching the database. The bill must
+    exist first, or any guessed ETag would be answered.
+    """
+    invoice = get_invoice_html(bill_id)
+    if invoice is None:
+        raise Http404('No bill matches the given query.')
+    etag = bill_etag(bill_id)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, 'billing/bill_detail.html', {
+            'bill_id': bill_id,
+            'invoice': mark_safe(invoice)
+        })
+    response['ETag'] = etag
+    patch_cache_control(
+        response, private=True, max_age=getattr(settings, 'BILL_PAGE_MAX_AGE', 604800), immutable=True
+    )
+    return response
 
 
 def customer_purchases(request):
     """View all purchases by a customer"""
-    customer_email = request.GET.get('email', '').strip()
+    customer_email = normalise_email(request.GET.get('email', ''))
     
     if not customer_email:
         return render(request, 'billing/customer_purchases.html', {
@@ -262,41 +327,169 @@ def customer_purchases(request):
             'customer_email': ''
         })
     
-    bills = Bill.objects.filter(customer_email=customer_email).prefetch_related('items__product')
+    # Archived bills are listed with live ones; both are shown from their snapshots
+    bills, next_cursor = merged_keyset_page(
+        [
+            Bill.objects.filter(customer_email=customer_email)
+            .only('id', 'customer_email', 'created_at', 'snapshot'),
+            ArchivedBill.objects.filter(customer_email=customer_email),
+        ],
+        request.GET.get('cursor')
+    )
+    bills = bill_receipts(bills)
+    
+    summary = CustomerSummary.objects.filter(customer_email=customer_email).first()
     
     return render(request, 'billing/customer_purchases.html', {
         'bills': bills,
-        'customer_email': customer_email
+        'customer_email': customer_email,
+        'next_cursor': next_cursor,
+        'summary': summary,
+        'top_products': top_products(summary)
     })
 
 
 def products_list(request):
-    """Show list of products (for browser viewing)"""
-    products = Product.objects.all()
-    return render(request, 'billing/products.html', {'products': products})
+    """Show a page of products, optionally filtered by name or product ID (for browser viewing)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
+    
+    # The rendered table is cached per catalogue version, search and page
+    version = catalogue_version()
+    
+    def table_key(number):
+        return 'products-table:' + hashlib.md5(f'{version}|{query}|{number}'.encode()).hexdigest()
+    
+    table = cache.get(table_key(page_number))
+    if table is None:
+        products = with_counters(Product.objects.order_by('name', 'id'))
+        if query:
+            # A substring match would scan the table; prefixes seek the indexes
+            products = search_products(products, query)
+        paginator = Paginator(products, getattr(settings, 'PRODUCTS_PAGE_SIZE', 100))
+        page = paginator.get_page(page_number)
+        table = render_to_string('billing/product_table.html', {
+            'page': page,
+            'query': query
+        })
+        # Pages past the end show the last one; only real page numbers get an entry
+        cache.set(table_key(page.number), table, catalogue_page_timeout())
+    
+    return render(request, 'billing/products.html', {'table': mark_safe(table), 'query': query})
 
 
 def bills_list(request):
     """Show list of bills (for browser viewing)"""
-    bills = Bill.objects.all().prefetch_related('items__product')
-    return render(request, 'billing/bills.html', {'bills': bills})
+    bills, next_cursor = keyset_page(Bill.objects.all(), request.GET.get('cursor'))
+    return render(request, 'billing/bills.html', {'bills': bills, 'next_cursor': next_cursor})
 
 
-def get_product_info(request, product_id):
-    """API endpoint to get product information"""
+def export_bills(request):
+    """Stream bills, live and archived, with their items and balance denominations as CSV or JSONL"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unsupported format: {export_format}'}, status=400)
+    
     try:
-        product = Product.objects.get(product_id=product_id)
+        start = parse_export_date(request.GET.get('start', '').strip())
+        end = parse_export_date(request.GET.get('end', '').strip())
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    email = request.GET.get('email', '').strip()
+    bills = export_queryset(start, end, email)
+    archived = archived_export_queryset(start, end, email)
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(iter_export(export_format, bills, archived=archived), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="bills.{export_format}"'
+    return response
+
+
+def sales_report_api(request):
+    """API endpoint for revenue and tax by day/product/tax rate over a date range"""
+    group = request.GET.get('group', 'day')
+    if group not in REPORT_GROUPS:
         return JsonResponse({
+            'error': f'Unsupported group: {group}. Use one of {", ".join(REPORT_GROUPS)}'
+        }, status=400)
+    
+    try:
+        start = parse_export_date(request.GET.get('start', '').strip())
+        end = parse_export_date(request.GET.get('end', '').strip())
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    rows, totals = sales_report(start, end, group)
+    return JsonResponse({
+        'success': True,
+        'group': group,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'rows': rows,
+        'totals': totals
+    })
+
+
+def get_product_info(request, product_id):
+    """API endpoint to get product information"""
+    product = get_product(product_id)
+    if product is None:
+        return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+    
+    # Scanners revalidate with If-None-Match / If-Modified-Since and get a 304
+    etag = f'"{product_id}-{product["updated_at"].timestamp()}-{product["available_stocks"]}"'
+    last_modified = int(product['updated_at'].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse({
             'success': True,
             'product': {
-                'name': product.name,
-                'price': str(product.price),
-                'tax_percentage': str(product.tax_percentage),
-                'available_stocks': product.available_stocks
+                'name': product['name'],
+                'price': product['price'],
+                'tax_percentage': product['tax_percentage'],
+                'available_stocks': product['available_stocks']
             }
         })
-    except Product.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def get_products_batch(request):
+    """API endpoint to look up a whole basket of products in one request"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    product_ids = data.get('product_ids') if isinstance(data, dict) else None
+    if not isinstance(product_ids, list) or not product_ids:
+        return JsonResponse({'error': 'product_ids must be a non-empty list'}, status=400)
+    
+    limit = getattr(settings, 'PRODUCT_BATCH_LIMIT', 500)
+    if len(product_ids) > limit:
+        return JsonResponse({'error': f'At most {limit} product IDs per request'}, status=400)
+    
+    products, not_found = get_products(str(product_id).strip() for product_id in product_ids)
+    return JsonResponse({
+        'success': True,
+        'products': {
+            product_id: {
+                'name': product['name'],
+                'price': product['price'],
+                'tax_percentage': product['tax_percentage'],
+                'available_stocks': product['available_stocks']
+            }
+            for product_id, product in products.items()
+        },
+        'not_found': not_found
+    })
 
 
 def users_list(request):
@@ -308,10 +501,18 @@ def users_list(request):
 def user_detail(request, user_id):
     """Show user profile details"""
     user_profile = get_object_or_404(UserProfile, user_id=user_id)
-    bills = Bill.objects.filter(customer_email=user_profile.user.email).prefetch_related('items__product')
+    customer_email = normalise_email(user_profile.user.email)
+    bills, next_cursor = keyset_page(
+        Bill.objects.filter(customer_email=customer_email),
+        request.GET.get('cursor')
+    )
+    summary = CustomerSummary.objects.filter(customer_email=customer_email).first()
     return render(request, 'billing/user_detail.html', {
         'user_profile': user_profile,
-        'bills': bills
+        'bills': bills,
+        'next_cursor': next_cursor,
+        'summary': summary,
+        'top_products': top_products(summary)
     })
 
 
@@ -369,3 +570,8 @@ def user_profile_form(request):
         })
     
     return render(request, 'billing/user_profile_form.html')
+
+
+def metrics(request):
+    """Request timings and SQL counts for this process in the Prometheus text format"""
+    return HttpResponse(expose_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
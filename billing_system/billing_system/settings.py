@@ -20,6 +20,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack; see /metrics
+    'billing.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -29,6 +31,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Development aid: flag requests that run more than QUERY_BUDGET SQL queries.
+# The dearest checkout check_query_budgets runs (a new customer paying cash)
+# needs 21; a sharded product's counter adds two more.
+QUERY_BUDGET = 24
+if DEBUG:
+    MIDDLEWARE.append('billing.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'billing_system.urls'
 
 TEMPLATES = [
@@ -49,11 +58,44 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'billing_system.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database profile, chosen with BILLING_DB_ENGINE:
+#   sqlite (default) - single file, WAL journal so readers never wait for a checkout
+#   postgresql       - for production; needs `pip install "psycopg[binary]"`
+DATABASE_ENGINE = os.environ.get('BILLING_DB_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BILLING_DB_NAME', 'billing'),
+            'USER': os.environ.get('BILLING_DB_USER', 'billing'),
+            'PASSWORD': os.environ.get('BILLING_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BILLING_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('BILLING_DB_PORT', '5432'),
+            # Keep connections open between requests and check them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('BILLING_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            # Behind PgBouncer in transaction pooling mode, server-side cursors
+            # (used by exports and rebuilds) cannot span pooled transactions
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('BILLING_DB_POOLER') == 'pgbouncer',
+        }
+    }
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BILLING_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
+else:
+    raise ValueError(f'Unsupported BILLING_DB_ENGINE: {DATABASE_ENGINE}')
+
+# Applied to every new SQLite connection (see billing/signals.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',    # safe with WAL; fsync at checkpoints instead of every commit
+    'busy_timeout': 5000,       # milliseconds to wait for a writer instead of failing
+    'mmap_size': 134217728,     # 128 MiB of the database file read through mmap
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -84,6 +126,53 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Strategy used to work out the notes returned as balance.
+# 'billing.change.GreedyChangeEngine' restores the old highest-note-first behaviour.
+CHANGE_ENGINE = 'billing.change.OptimalChangeEngine'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'billing',
+    }
+}
+
+# Use a shared backend (Redis/Memcached) when running several worker processes.
+# Product lookup cache for /api/product/<id>/, in seconds.
+# Stock uses its own short tier; set PRODUCT_STOCK_CACHE_TIMEOUT = None to always read it live.
+PRODUCT_CACHE_TIMEOUT = 300
+PRODUCT_STOCK_CACHE_TIMEOUT = 5
+
+# Maximum product IDs accepted by /api/products/batch/
+PRODUCT_BATCH_LIMIT = 500
+
+# Products per page on /products/, and how long a rendered page is reused.
+# Product and denomination edits retire cached pages at once; stock shown
+# there can lag checkouts by up to CATALOGUE_PAGE_CACHE_TIMEOUT seconds.
+PRODUCTS_PAGE_SIZE = 100
+CATALOGUE_PAGE_CACHE_TIMEOUT = 60
+
+# Bills per page on keyset-paginated listings
+BILLS_PAGE_SIZE = 50
+
+# Admin changelists of unfiltered tables larger than this show a row count
+# estimated from database statistics instead of running COUNT(*)
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Bill pages are immutable: browsers may keep one for BILL_PAGE_MAX_AGE seconds
+# and revalidate it with its ETag; snapshots stay in the cache this long
+BILL_PAGE_MAX_AGE = 7 * 24 * 3600
+BILL_SNAPSHOT_CACHE_TIMEOUT = 24 * 3600
+
+# `manage.py archive_bills` moves bills older than this many days out of the
+# live tables; bill pages and purchase history still show them
+BILL_ARCHIVE_AFTER_DAYS = 2 * 365
+
+# Bulk ingestion from offline terminals (/bills/import/ and `manage.py import_bills`):
+# bills per transaction, and most bills accepted in one HTTP request
+BILL_IMPORT_CHUNK_SIZE = 100
+BILL_IMPORT_LIMIT = 1000
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # For production, use SMTP:
@@ -94,3 +183,9 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # EMAIL_HOST_USER = 'your-email@gmail.com'
 # EMAIL_HOST_PASSWORD = 'your-app-password'
 DEFAULT_FROM_EMAIL = 'billing@example.com'
+
+# Invoice emails are queued in the outbox and delivered by
+# `python manage.py send_invoice_emails [--loop]`
+INVOICE_EMAIL_MAX_ATTEMPTS = 5
+INVOICE_EMAIL_RETRY_BACKOFF = 60  # seconds, doubled after every failed attempt
+INVOICE_EMAIL_CLAIM_TIMEOUT = 300  # seconds a worker holds a batch before others may retry it